@@ -0,0 +1,155 @@
+#Importing required libraries:
+import contextlib
+import math
+import threading
+import time
+import metrics
+import police_api
+import store
+
+
+#Admission control of the requests building records ("all_crime_data", its streams and its batch sub-queries).
+#Their cost is estimated from the size of the month in the store before any work is done. A request runs when it
+#fits in the budget of the process and in the budget of its user, waits in a short queue otherwise, and is
+#rejected with a 429 and a "Retry-After" header when the queue is full or the wait times out.
+#The cheap endpoints (counts, graphs, top, distinct) never go through the controller.
+
+#Peak memory and CPU time of building, serialising and sending one record (measured with benchmarks/micro.py):
+BYTES_PER_RECORD = 2048
+SECONDS_PER_RECORD = 0.00003
+
+#Records assumed for a month that has not been ingested yet:
+DEFAULT_MONTH_RECORDS = 5000
+
+
+#Raised when a request cannot be admitted, with the seconds the client should wait before retrying:
+class Rejected(Exception):
+
+    def __init__(self, retry_after):
+        super(Rejected, self).__init__('Too many heavy requests in progress')
+        self.retry_after = retry_after
+
+
+#Estimated cost of a request as "(bytes, seconds)":
+class Cost(object):
+
+    def __init__(self, n_records):
+        self.n_records = n_records
+        self.bytes = n_records * BYTES_PER_RECORD
+        self.seconds = n_records * SECONDS_PER_RECORD
+
+    def __add__(self, other):
+        return Cost(self.n_records + other.n_records)
+
+
+#Records of a month (ex. "201811") from the store, or the default if the month has not been ingested:
+def month_records(date):
+    n_records = store.month_records(police_api.format_date(date))
+    return DEFAULT_MONTH_RECORDS if n_records is None else n_records
+
+
+#Cost of the records of one month ("n_records" is "All" or the amount of records requested):
+def records_cost(date, n_records="All"):
+    available = month_records(date)
+    try:
+        return Cost(min(available, max(0, int(n_records))))
+    except (TypeError, ValueError):
+        return Cost(available)
+
+
+#Cost of the "all_crime_data" sub-queries of a batch (the counts are cheap and not counted):
+def batch_cost(queries):
+    total = Cost(0)
+    for query in queries:
+        if query["endpoint"] == "all_crime_data":
+            total += records_cost(query["date"], query.get("n_records", 100))
+    return total
+
+
+#Cost of a stream of records: the month being sent plus the months fetched ahead of it:
+def stream_cost(dates, prefetch):
+    largest = max(month_records(date) for date in dates)
+    return Cost(largest * min(len(dates), prefetch + 1))
+
+
+#Budgets shared by the threads of a worker process:
+class AdmissionController(object):
+
+    def __init__(self, process_bytes, user_bytes, queue_seconds=10.0, max_queue=32):
+        self.process_bytes = process_bytes
+        self.user_bytes = user_bytes
+        self.queue_seconds = queue_seconds
+        self.max_queue = max_queue
+        self.used = 0
+        self.seconds = 0.0
+        self.users = {}
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    #A request larger than a budget is still admitted when nothing else is using that budget:
+    def _fits(self, user, cost):
+        used_by_user = self.users.get(user, 0)
+        return ((self.used == 0 or self.used + cost.bytes <= self.process_bytes) and
+                (used_by_user == 0 or used_by_user + cost.bytes <= self.user_bytes))
+
+    #Seconds until the requests in progress should be done:
+    def _retry_after(self):
+        return max(1, int(math.ceil(self.seconds)))
+
+    #Waiting until the request fits in the budgets, or raising "Rejected":
+    def acquire(self, user, cost):
+        route = metrics.current_route.get()
+        deadline = time.monotonic() + self.queue_seconds
+        with self._cond:
+            if not self._fits(user, cost):
+                if self.waiting >= self.max_queue:
+                    metrics.ADMISSION_REQUESTS.inc(route, 'rejected')
+                    raise Rejected(self._retry_after())
+                metrics.ADMISSION_REQUESTS.inc(route, 'queued')
+                self.waiting += 1
+                try:
+                    while not self._fits(user, cost):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            metrics.ADMISSION_REQUESTS.inc(route, 'rejected')
+                            raise Rejected(self._retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            metrics.ADMISSION_REQUESTS.inc(route, 'admitted')
+            self.used += cost.bytes
+            self.seconds += cost.seconds
+            self.users[user] = self.users.get(user, 0) + cost.bytes
+            metrics.ADMISSION_BYTES.set(self.used)
+
+    #Giving the budget of a finished request back to the queued ones:
+    def release(self, user, cost):
+        with self._cond:
+            self.used -= cost.bytes
+            self.seconds -= cost.seconds
+            self.users[user] = self.users.get(user, 0) - cost.bytes
+            if self.users[user] <= 0:
+                del self.users[user]
+            metrics.ADMISSION_BYTES.set(self.used)
+            self._cond.notify_all()
+
+    #Admitting a request whose budget is given back later (ex. when a stream is closed). The returned function
+    #releases the budget and can safely be called more than once:
+    def hold(self, user, cost):
+        self.acquire(user, cost)
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                self.release(user, cost)
+        return release
+
+    #Running a block once the request is admitted:
+    @contextlib.contextmanager
+    def admit(self, user, cost):
+        self.acquire(user, cost)
+        try:
+            yield
+        finally:
+            self.release(user, cost)
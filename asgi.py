@@ -0,0 +1,383 @@
+#Importing required libraries:
+import asyncio
+import base64
+import binascii
+import contextlib
+import functools
+import json
+import time
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse as StarletteJSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from app import create_app
+from models import check_credentials
+import admission
+import batch
+import streaming
+import store
+import charts
+import circuit
+import compact
+import crime_stats
+import metrics
+import police_api
+import ratelimit
+
+#ASGI serving mode of the data routes. Every upstream call is awaited on an "httpx.AsyncClient", so thousands
+#of requests waiting on data.police.uk cost coroutines instead of worker threads. Run it with:
+#    uvicorn asgi:application --port 8080
+#The URL layout is the same as "app.py" and every other path ("/api/users", "/api/token", ...) is served by the
+#Flask app mounted underneath.
+
+#The Flask app serving the other paths (its configuration is shared by the async views):
+app = create_app()
+
+#Keeping the decoded months for as long as "requests_cache" keeps the responses of the blocking app:
+MONTH_CACHE_EXPIRE = 36000
+MONTH_CACHE_SIZE = 16
+
+#Shared client and the months that are being (or have been) fetched, as "url: task" (forgotten when a snapshot
+#replaces the store):
+client = None
+_months = store.GenerationCache(MONTH_CACHE_SIZE)
+
+
+#Running a blocking call in the threadpool within the context of the Flask app (the modules read its settings, budgets
+#and buckets from "current_app"):
+async def in_threadpool(function, *args):
+    return await run_in_threadpool(batch.in_app_context, app, function, *args)
+
+
+#JSON responses rendered like "jsonify" (missing values of the records are written as NaN):
+class JSONResponse(StarletteJSONResponse):
+
+    def render(self, content):
+        with metrics.stage('jsonify'):
+            return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+#Fetching, flattening and ingesting one month (the batches are flattened while the response is still arriving and
+#the month is kept in the memory cache as compact columns):
+async def _fetch_columns(date):
+    month = police_api.format_date(date)
+    ingest = None if await in_threadpool(store.is_ingested, month) else store.MonthIngest(month)
+    columns = compact.CompactMonth()
+    async for records in police_api.fetch_month_batches_async(client, date):
+        await in_threadpool(columns.extend, records)
+        if ingest is not None:
+            await in_threadpool(ingest.add, records)
+    columns.seal()
+    if ingest is not None:
+        await in_threadpool(ingest.finish, columns)
+    return columns
+
+
+#Loading the flattened records of one month. Concurrent requests for the same month share a single upstream call:
+async def load_columns(date):
+    url = police_api.crime_url(date)
+    task = _months.get(url)
+    metrics.cache_lookup('memory', task is not None)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_columns(date))
+        _months.put(url, task, MONTH_CACHE_EXPIRE)
+
+        #Removing the month again if the fetch fails, so the next request retries it:
+        def forget_failure(t):
+            if t.cancelled() or t.exception() is not None:
+                _months.discard(url, t)
+        task.add_done_callback(forget_failure)
+
+    #A client disconnecting must not cancel the fetch the other requests are waiting on. If the Police API is
+    #unhealthy the month is read from the store instead (the response is then flagged as stale):
+    try:
+        return await asyncio.shield(task)
+    except police_api.UpstreamError as e:
+        return await in_threadpool(circuit.stale_columns, date, e)
+
+
+#Checking if a month is in the memory cache (so loading it does not call the Police API):
+def _is_loaded(date):
+    return _months.get(police_api.crime_url(date)) is not None
+
+
+#Authenticating the Basic "Authorization" header with the same function used by "auth.verify_password" (returns the id of the user or "None"):
+def _authenticate(header):
+    username_or_token, password = '', ''
+    if header and header.lower().startswith('basic '):
+        try:
+            decoded = base64.b64decode(header[6:].strip()).decode('utf-8')
+        except (binascii.Error, UnicodeDecodeError):
+            decoded = ''
+        username_or_token, _, password = decoded.partition(':')
+    user = check_credentials(username_or_token, password)
+    return None if user is None else user.id
+
+
+#Async version of "auth.login_required" (same challenge and error message as "flask_httpauth"):
+def login_required(view):
+    @functools.wraps(view)
+    async def wrapper(request):
+        request.state.user_id = await in_threadpool(_authenticate, request.headers.get('Authorization'))
+        if request.state.user_id is None:
+            return PlainTextResponse('Unauthorized Access', status_code=401,
+                                     headers={'WWW-Authenticate': 'Basic realm="Authentication Required"'})
+        return await view(request)
+    return wrapper
+
+
+#Answering with a 429 when a heavy request does not fit in the memory budgets:
+def too_many_requests(e):
+    return JSONResponse({'error': str(e)}, status_code=429, headers={'Retry-After': str(e.retry_after)})
+
+
+#Estimating the cost of a heavy request and waiting for its budget (in a thread, both block), returning the function releasing it:
+async def admit(request, estimate, *args):
+    return await in_threadpool(lambda: app.extensions['admission'].hold(request.state.user_id, estimate(*args)))
+
+
+#Costs of the data requests for the rate limits (see ratelimit.py):
+async def month_cost(request):
+    return ratelimit.request_cost(0 if _is_loaded(request.path_params['date']) else 1)
+
+
+async def graph_cost(request):
+    return ratelimit.request_cost(0 if _is_loaded(request.path_params['date']) else 1, plots=1)
+
+
+async def range_cost(request):
+    try:
+        dates = streaming.month_range(request.path_params['start_date'], request.path_params['end_date'])
+    except ValueError:
+        return ratelimit.request_cost()
+    return ratelimit.request_cost(sum(1 for date in dates if not _is_loaded(date)))
+
+
+async def batch_cost(request):
+    try:
+        dates = batch.distinct_dates(batch.parse_queries(await request.json()))
+    except ValueError:
+        return ratelimit.request_cost()
+    return ratelimit.request_cost(sum(1 for date in dates if not _is_loaded(date)))
+
+
+#Taking the cost of the request from the buckets of the user (or of its address if the route is not authenticated):
+def rate_limited(cost):
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request):
+            limiter = app.extensions['ratelimit']
+            if limiter is None:
+                return await view(request)
+            user = getattr(request.state, 'user_id', None) or (request.client.host if request.client else None)
+            decision = await in_threadpool(limiter.consume, user, *(await cost(request))) #Takes a file lock
+            if decision.allowed:
+                response = await view(request)
+            else:
+                response = JSONResponse({'error': 'Rate limit exceeded'}, status_code=429)
+            response.headers.update(decision.headers())
+            return response
+        return wrapper
+    return decorator
+
+
+#Returning the "status_code" of the Police API when it does not answer with a 200:
+def upstream_errors(view):
+    @functools.wraps(view)
+    async def wrapper(request):
+        try:
+            return await view(request)
+        except police_api.CircuitOpen as e:
+            return PlainTextResponse("There has been an error", status_code=e.status_code,
+                                     headers={'Retry-After': str(e.retry_after)})
+        except police_api.UpstreamError as e:
+            return PlainTextResponse("There has been an error", status_code=e.status_code)
+    return wrapper
+
+
+@login_required
+@rate_limited(month_cost)
+@upstream_errors
+async def get_records(request):
+    date = request.path_params['date']
+    try:
+        release = await admit(request, admission.records_cost, date, request.path_params['n_records'])
+    except admission.Rejected as e:
+        return too_many_requests(e)
+    try:
+        columns = await load_columns(date)
+        result = await in_threadpool(crime_stats.select_records, columns, police_api.format_date(date),
+                                         request.path_params['n_records'], request.path_params['csv'])
+        if isinstance(result, str):
+            return PlainTextResponse(result, media_type='text/html')
+        return JSONResponse(result)
+    finally:
+        release()
+
+
+#Building the async views of the count endpoints:
+def count_view(count):
+    @rate_limited(month_cost)
+    @upstream_errors
+    async def view(request):
+        columns = await load_columns(request.path_params['date'])
+        return JSONResponse(await in_threadpool(count, columns))
+    return view
+
+
+#Building the async views of the graph endpoints (the count series are kept by the month in the memory cache, so the
+#count endpoints and the graphs of a month count it once):
+def graph_view(column, subject):
+    @login_required
+    @rate_limited(graph_cost)
+    @upstream_errors
+    async def view(request):
+        date = request.path_params['date']
+        series = await in_threadpool(crime_stats.count_series, await load_columns(date), column)
+        fig = charts.count_figure(series, subject, police_api.format_date(date))
+        return JSONResponse(await in_threadpool(charts.plot_figure, fig, app.config['MY_API_KEY'], app.config['PLOTLY_OFFLINE']))
+    return view
+
+
+@login_required
+@rate_limited(graph_cost)
+@upstream_errors
+async def get_graphs(request):
+    date = request.path_params['date']
+    series = await in_threadpool(crime_stats.month_series, await load_columns(date))
+    fig = charts.all_stats_figure(series, police_api.format_date(date))
+    return JSONResponse(await in_threadpool(charts.plot_figure, fig, app.config['MY_API_KEY'], app.config['PLOTLY_OFFLINE']))
+
+
+@login_required
+@rate_limited(batch_cost)
+async def batch_queries(request):
+    try:
+        queries = batch.parse_queries(await request.json())
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    try:
+        release = await admit(request, admission.batch_cost, queries)
+    except admission.Rejected as e:
+        return too_many_requests(e)
+
+    #Resolving each distinct month once, then running the sub-queries concurrently against the shared snapshots:
+    try:
+        dates = batch.distinct_dates(queries)
+        resolved = await asyncio.gather(*[load_columns(date) for date in dates], return_exceptions=True)
+        for result in resolved:
+            if isinstance(result, BaseException) and not isinstance(result, police_api.UpstreamError):
+                raise result
+        snapshots = dict(zip(dates, resolved))
+        results = await asyncio.gather(*[in_threadpool(batch.run_query, query, snapshots) for query in queries])
+        return JSONResponse({"results": results})
+    finally:
+        release()
+
+
+@login_required
+@rate_limited(range_cost)
+async def stream_months(request):
+    endpoint = request.path_params['endpoint']
+    if endpoint not in streaming.STREAM_ENDPOINTS:
+        return PlainTextResponse("There has been an error", status_code=404)
+    try:
+        dates = streaming.month_range(request.path_params['start_date'], request.path_params['end_date'])
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    #Streams of records keep their memory budget until the stream ends:
+    release = lambda: None
+    if endpoint == "all_crime_data":
+        try:
+            release = await admit(request, admission.stream_cost, dates, streaming.PREFETCH_MONTHS)
+        except admission.Rejected as e:
+            return too_many_requests(e)
+
+    #Emitting each month as soon as it is ready, while the next months are already being fetched:
+    async def events():
+        job = streaming.StreamJob(endpoint, dates)
+        pending = [asyncio.ensure_future(load_columns(date)) for date in dates[:streaming.PREFETCH_MONTHS]]
+        try:
+            for event in job.start():
+                yield event
+            for i, date in enumerate(dates):
+                task = pending.pop(0)
+                if i + streaming.PREFETCH_MONTHS < len(dates):
+                    pending.append(asyncio.ensure_future(load_columns(dates[i + streaming.PREFETCH_MONTHS])))
+                try:
+                    columns = await task
+                    month_events = await in_threadpool(job.month, date, columns, streaming.is_stale(date))
+                except police_api.UpstreamError as e:
+                    month_events = job.failed(date, e)
+                for event in month_events:
+                    yield event
+            for event in job.finish():
+                yield event
+
+        #The client cancelled the job:
+        finally:
+            for task in pending:
+                task.cancel()
+            release()
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}, background=BackgroundTask(release))
+
+
+#Labelling the metrics of the request with the name of its view, recording its duration and flagging the responses
+#holding months served from the store:
+def instrumented(name, view):
+    @functools.wraps(view)
+    async def wrapper(request):
+        metrics.current_route.set(name)
+        circuit.stale_months.set({})
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await view(request)
+            status = response.status_code
+            response.headers.update(circuit.staleness_headers(circuit.stale_months.get()))
+            return response
+        finally:
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, name, status)
+    return wrapper
+
+
+#Opening the shared client when the server starts and closing it when the server stops. The context of the Flask app
+#stays pushed on the thread of the event loop meanwhile, so the async views read its settings as the Flask views do:
+@contextlib.asynccontextmanager
+async def lifespan(application):
+    global client
+    client = httpx.AsyncClient(timeout=app.config['UPSTREAM_TIMEOUT_SECONDS'], limits=httpx.Limits(max_connections=100))
+    context = app.app_context()
+    context.push()
+    try:
+        yield
+    finally:
+        context.pop()
+        await client.aclose()
+
+
+#The views are named like the views of the Flask app, so both report the same routes on "/metrics":
+routes = [
+    Route('/api/all_crime_data/{date}/{n_records}/{csv}', instrumented('get_records', get_records), methods=['GET']),
+    Route('/api/code_count/{date}', instrumented('get_code', count_view(crime_stats.code_count)), methods=['GET']),
+    Route('/api/code_count/graph/{date}', instrumented('get_code_graph', graph_view("codes", "Consequences")), methods=['GET']),
+    Route('/api/location_count/{date}', instrumented('get_loc', login_required(count_view(crime_stats.location_count))), methods=['GET']),
+    Route('/api/location_count/graph/{date}', instrumented('get_loc_graph', graph_view("location_subtypes", "Sub_Location")), methods=['GET']),
+    Route('/api/crime_count/{date}', instrumented('get_crime', login_required(count_view(crime_stats.crime_count))), methods=['GET']),
+    Route('/api/crime_count/graph/{date}', instrumented('get_crime_graph', graph_view("crime_categories", "Category")), methods=['GET']),
+    Route('/api/all_graphs/{date}', instrumented('get_graphs', get_graphs), methods=['GET']),
+    Route('/api/batch', instrumented('batch_queries', batch_queries), methods=['POST']),
+    Route('/api/stream/{endpoint}/{start_date}/{end_date}', instrumented('stream_months', stream_months), methods=['GET']),
+
+    #Every other path is served by the Flask app, its requests running on a pool of threads:
+    Mount('/', WSGIMiddleware(app, workers=app.config['ASGI_WSGI_THREADS'])),
+]
+
+application = Starlette(routes=routes, lifespan=lifespan)
@@ -0,0 +1,105 @@
+#Importing required libraries:
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+import crime_stats
+import metrics
+import police_api
+import profiling
+
+
+#Maximum amount of sub-queries accepted by a single "/api/batch" request:
+MAX_BATCH_QUERIES = 50
+
+#Threads used to resolve the months and to run the sub-queries of a batch:
+executor = ThreadPoolExecutor(max_workers=8)
+
+
+#Calling a function within the context of an app (the modules read its settings from "current_app"):
+def in_app_context(app, function, *args):
+    with app.app_context():
+        return function(*args)
+
+
+#Submitting a call to the threads, keeping the context of the request (ex. the route labelling the metrics), its
+#profiler and the app serving it:
+def submit(function, *args):
+    session = profiling.current.get()
+    if session is not None:
+        function, args = session.run_in_thread, (function,) + args
+    if has_app_context():
+        function, args = in_app_context, (current_app._get_current_object(), function) + args
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+
+#Calling a function on every item in the threads and returning the results in order:
+def map_in_context(function, items):
+    return [future.result() for future in [submit(function, item) for item in items]]
+
+
+#Returning a page of records in the same format as the "all_crime_data" endpoint:
+@metrics.timed('pandas')
+def records_page(columns, query):
+    offset = int(query.get("offset", 0))
+    n_records = int(query.get("n_records", 100))
+    page = crime_stats.records_frame(columns, offset, offset + n_records)
+    return list(page.to_dict(orient = "index").items())
+
+
+#Operations a sub-query can run against the snapshot of its month:
+OPERATIONS = {
+    "code_count": lambda columns, query: crime_stats.code_count(columns),
+    "location_count": lambda columns, query: crime_stats.location_count(columns),
+    "crime_count": lambda columns, query: crime_stats.crime_count(columns),
+    "all_crime_data": records_page,
+}
+
+
+#Validating the body of a batch request (ex. {"queries": [{"endpoint": "code_count", "date": "201811"}]}):
+def parse_queries(body):
+    queries = body.get("queries") if isinstance(body, dict) else None
+    if not isinstance(queries, list) or not queries:
+        raise ValueError('The body must contain a non-empty "queries" list')
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise ValueError('A batch accepts at most {} queries'.format(MAX_BATCH_QUERIES))
+    for query in queries:
+        if not isinstance(query, dict) or query.get("endpoint") not in OPERATIONS or not query.get("date"):
+            raise ValueError('Every query needs a "date" and one of the endpoints: {}'.format(", ".join(sorted(OPERATIONS))))
+    return queries
+
+
+#Listing each distinct month of the batch once, in order of appearance:
+def distinct_dates(queries):
+    return list(dict.fromkeys(str(query["date"]) for query in queries))
+
+
+#Resolving the snapshot of a month, keeping the error of the Police API as the result if it fails:
+def resolve(load_columns, date):
+    try:
+        return load_columns(date)
+    except police_api.UpstreamError as e:
+        return e
+
+
+#Running one sub-query against the resolved snapshots:
+def run_query(query, snapshots):
+    columns = snapshots[str(query["date"])]
+    answer = {"endpoint": query["endpoint"], "date": query["date"]}
+    if isinstance(columns, police_api.UpstreamError):
+        answer["status"] = columns.status_code
+        answer["error"] = "There has been an error"
+        return answer
+    try:
+        answer["result"] = OPERATIONS[query["endpoint"]](columns, query)
+        answer["status"] = 200
+    except (TypeError, ValueError):
+        answer["status"] = 400
+        answer["error"] = "Invalid query parameters"
+    return answer
+
+
+#Resolving each distinct month once and running every sub-query concurrently against that shared snapshot:
+def run_batch(queries, load_columns):
+    dates = distinct_dates(queries)
+    snapshots = dict(zip(dates, map_in_context(lambda date: resolve(load_columns, date), dates)))
+    return {"results": map_in_context(lambda query: run_query(query, snapshots), queries)}
@@ -0,0 +1,268 @@
+#Load driver exercising every route of app.py with authentication, reporting throughput and latency percentiles.
+#
+#    python -m benchmarks.load_test run --target http://127.0.0.1:8080 --secret-key supersecret --out run.json
+#    python -m benchmarks.load_test compare base.json run.json --p95 10 --throughput 10 --thresholds thresholds.json
+#
+#Start the app against the stub server first (see benchmarks/stub_server.py), so the runs are reproducible offline.
+
+#Importing required libraries:
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+#Every route of the app as (name, method, path template, body). The templates are filled with the options of the run:
+SCENARIOS = [
+    ("register", "POST", "/api/users", lambda o: {"username": "bench_{}".format(uuid.uuid4().hex[:12]), "password": "bench"}),
+    ("token", "GET", "/api/token", None),
+    ("get_user", "GET", "/api/users/{user_id}/{secret_key}", None),
+    ("all_users_names", "GET", "/api/all_users_names/{secret_key}", None),
+    ("all_users_ids", "GET", "/api/all_users_ids/{secret_key}", None),
+    ("all_crime_data_100", "GET", "/api/all_crime_data/{date}/100/no_csv", None),
+    ("all_crime_data_all", "GET", "/api/all_crime_data/{date}/All/no_csv", None),
+    ("code_count", "GET", "/api/code_count/{date}", None),
+    ("location_count", "GET", "/api/location_count/{date}", None),
+    ("crime_count", "GET", "/api/crime_count/{date}", None),
+    ("code_count_graph", "GET", "/api/code_count/graph/{date}", None),
+    ("location_count_graph", "GET", "/api/location_count/graph/{date}", None),
+    ("crime_count_graph", "GET", "/api/crime_count/graph/{date}", None),
+    ("all_graphs", "GET", "/api/all_graphs/{date}", None),
+    ("batch", "POST", "/api/batch", lambda o: {"queries": [
+        {"endpoint": "code_count", "date": o["date"]}, {"endpoint": "location_count", "date": o["date"]},
+        {"endpoint": "crime_count", "date": o["date"]}, {"endpoint": "all_crime_data", "date": o["date"], "n_records": 100}]}),
+    ("stream_crime_count", "GET", "/api/stream/crime_count/{start_date}/{end_date}", None),
+    ("top_streets", "GET", "/api/top/streets/{start_date}/{end_date}", None),
+    ("distinct_persistent_ids", "GET", "/api/distinct/persistent_ids/{start_date}/{end_date}", None),
+]
+
+GRAPH_SCENARIOS = {"code_count_graph", "location_count_graph", "crime_count_graph", "all_graphs"}
+
+#Regressions tolerated by "compare": how much the p95 latency may grow and the throughput may drop, in percent, and
+#how many more failed requests (errors and 429s) the new run may have (a thresholds file can set them for each
+#endpoint, ex. {"default": {"p95": 10}, "all_graphs": {"p95": 25}}):
+DEFAULT_THRESHOLDS = {"p95": 10.0, "throughput": 10.0, "errors": 0}
+
+
+#Nearest-rank percentile of a sorted list:
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = max(1, int(math.ceil(p / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+#Summarising the latencies (in seconds) of the successful requests of one endpoint (the failed ones are only counted,
+#so a fast error or 429 neither lowers the percentiles nor adds to the throughput):
+def summarise(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else None,
+        "mean": sum(ordered) / len(ordered) if ordered else None,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else None,
+    }
+
+
+#Registering the user of the run and returning its credentials and id:
+def setup_user(target, secret_key):
+    username, password = "bench_{}".format(uuid.uuid4().hex[:12]), "bench"
+    resp = requests.post(target + "/api/users", json={"username": username, "password": password})
+    resp.raise_for_status()
+    user_id = 1
+    if secret_key:
+        #Following the pages of the ids up to the last one (the user just registered):
+        params = {"limit": 10000}
+        while True:
+            resp = requests.get(target + "/api/all_users_ids/{}".format(secret_key), params=params)
+            ids = resp.json()
+            user_id = ids[-1] if isinstance(ids, list) and ids else user_id
+            if "X-Next-After" not in resp.headers:
+                break
+            params["after"] = resp.headers["X-Next-After"]
+    return username, password, user_id
+
+
+#Running the requests of one endpoint at the given concurrency:
+def run_scenario(scenario, options, auth, params):
+    name, method, template, body = scenario
+    local = threading.local()
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        values = dict(params, date=options.dates[i % len(options.dates)])
+        url = options.target + template.format(**values)
+        started = time.perf_counter()
+        try:
+            resp = session.request(method, url, auth=auth, json=body(values) if body else None, timeout=options.timeout)
+            ok = resp.status_code < 400
+            resp.content
+        except requests.RequestException:
+            ok = False
+        latency = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(latency)
+            else:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        list(executor.map(one, range(options.requests)))
+    return summarise(latencies, errors[0], time.perf_counter() - started)
+
+
+def run(options):
+    username, password, user_id = setup_user(options.target, options.secret_key)
+    token = requests.get(options.target + "/api/token", auth=(username, password)).json()["token"]
+    auth = (token, "unused") if options.auth == "token" else (username, password)
+    params = {"secret_key": options.secret_key, "user_id": user_id,
+              "start_date": options.dates[0], "end_date": options.dates[-1]}
+
+    report = {"meta": {"target": options.target, "requests": options.requests, "concurrency": options.concurrency,
+                       "auth": options.auth, "dates": options.dates, "started": time.time()},
+              "endpoints": {}}
+    for scenario in SCENARIOS:
+        name = scenario[0]
+        if options.only and name not in options.only:
+            continue
+        if name in GRAPH_SCENARIOS and not options.graphs:
+            continue
+        if "{secret_key}" in scenario[2] and not options.secret_key:
+            continue
+        report["endpoints"][name] = run_scenario(scenario, options, auth, params)
+        print_row(name, report["endpoints"][name])
+
+    if options.out:
+        with open(options.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def ms(value):
+    return "-" if value is None else "{:.1f}".format(value * 1000)
+
+
+def print_row(name, stats):
+    print("{:<26} {:>6} {:>6} {:>9.1f} {:>9} {:>9} {:>9}".format(
+        name, stats["requests"], stats["errors"], stats["throughput"] or 0, ms(stats["p50"]), ms(stats["p95"]), ms(stats["p99"])))
+
+
+#Change between two values, in percent (or "None" if there is nothing to compare):
+def percent_change(a, b):
+    return None if not a or b is None else (b - a) / a * 100
+
+
+#Thresholds of one endpoint: the defaults, then the "default" and the endpoint entries of the thresholds file:
+def endpoint_thresholds(thresholds, name, defaults):
+    limits = dict(defaults)
+    limits.update(thresholds.get("default", {}))
+    limits.update(thresholds.get(name, {}))
+    return limits
+
+
+#Comparing two reports endpoint by endpoint (positive changes of the latencies are regressions), returning the
+#endpoints whose p95 latency grew, whose throughput dropped or whose failed requests grew by more than their thresholds:
+def compare(base_path, new_path, defaults=DEFAULT_THRESHOLDS, thresholds_path=None):
+    with open(base_path) as f:
+        base = json.load(f)["endpoints"]
+    with open(new_path) as f:
+        new = json.load(f)["endpoints"]
+    thresholds = {}
+    if thresholds_path:
+        with open(thresholds_path) as f:
+            thresholds = json.load(f)
+
+    def change(a, b):
+        value = percent_change(a, b)
+        return "-" if value is None else "{:+.1f}%".format(value)
+
+    failures = []
+    print("{:<26} {:>10} {:>10} {:>10} {:>10} {:>10}  {}".format("endpoint", "req/s", "p50", "p95", "p99", "errors", "result"))
+    for name in sorted(set(base) & set(new)):
+        a, b = base[name], new[name]
+        limits = endpoint_thresholds(thresholds, name, defaults)
+        exceeded = []
+        p95 = percent_change(a["p95"], b["p95"])
+        if p95 is not None and p95 > limits["p95"]:
+            exceeded.append("p95 +{:.1f}% > {:g}%".format(p95, limits["p95"]))
+        throughput = percent_change(a["throughput"], b["throughput"])
+        if throughput is not None and -throughput > limits["throughput"]:
+            exceeded.append("req/s {:.1f}% < -{:g}%".format(throughput, limits["throughput"]))
+        if b["errors"] - a["errors"] > limits["errors"]:
+            exceeded.append("errors {} -> {}".format(a["errors"], b["errors"]))
+        if exceeded:
+            failures.append((name, exceeded))
+        print("{:<26} {:>10} {:>10} {:>10} {:>10} {:>10}  {}".format(
+            name, change(a["throughput"], b["throughput"]), change(a["p50"], b["p50"]),
+            change(a["p95"], b["p95"]), change(a["p99"], b["p99"]), "{:+d}".format(b["errors"] - a["errors"]),
+            "FAIL: " + ", ".join(exceeded) if exceeded else "ok"))
+
+    if failures:
+        print("\n{} endpoint(s) over their thresholds: {}".format(len(failures), ", ".join(name for name, _ in failures)))
+    return failures
+
+
+#Expanding "201801-201812" into the list of months:
+def parse_dates(value):
+    import streaming
+    start, _, end = value.partition("-")
+    return streaming.month_range(start, end or start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="load_test")
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--target", default="http://127.0.0.1:8080")
+    run_parser.add_argument("--secret-key", default=None, help="admin secret_key, needed by the admin endpoints")
+    run_parser.add_argument("--requests", type=int, default=200, help="requests sent to each endpoint")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--dates", type=parse_dates, default=["201811"], help="month or range of months (YYYYMM-YYYYMM)")
+    run_parser.add_argument("--auth", choices=["password", "token"], default="password")
+    run_parser.add_argument("--graphs", action="store_true", help="also run the graph endpoints (start the app with PLOTLY_OFFLINE=1)")
+    run_parser.add_argument("--only", nargs="*", help="names of the endpoints to run")
+    run_parser.add_argument("--timeout", type=float, default=60.0)
+    run_parser.add_argument("--out", default=None, help="path of the json report")
+
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--p95", type=float, default=DEFAULT_THRESHOLDS["p95"],
+                                help="growth of the p95 latency tolerated for every endpoint, in percent")
+    compare_parser.add_argument("--throughput", type=float, default=DEFAULT_THRESHOLDS["throughput"],
+                                help="drop of the throughput tolerated for every endpoint, in percent")
+    compare_parser.add_argument("--errors", type=int, default=DEFAULT_THRESHOLDS["errors"],
+                                help="failed requests (errors and 429s) the new run may add for every endpoint")
+    compare_parser.add_argument("--thresholds", default=None, help="json file of the thresholds of each endpoint")
+
+    options = parser.parse_args(argv)
+    if options.command == "run":
+        print("{:<26} {:>6} {:>6} {:>9} {:>9} {:>9} {:>9}".format("endpoint", "reqs", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms"))
+        run(options)
+    elif options.command == "compare":
+        defaults = {"p95": options.p95, "throughput": options.throughput, "errors": options.errors}
+        if compare(options.base, options.new, defaults, options.thresholds):
+            return 1
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#Micro-benchmarks of the parsing and aggregation stages of the hot path on synthetic months.
+#
+#    python -m benchmarks.micro --sizes 10000 100000 1000000 --out micro.json
+#    python -m benchmarks.micro --sizes 5000000 --stages flatten_records tally_codes --no-memory
+#
+#Each stage is timed on its own (best of --repeat runs) and, in a separate run, its peak memory is traced with
+#"tracemalloc". 5M records need several GB of memory for the decoded payload alone.
+
+#Importing required libraries:
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+import compact
+import crime_stats
+import police_api
+from benchmarks.synthetic import generate_records
+
+
+#Every stage as "name: (setup, run)". The setup builds the input of the stage outside of the measurement:
+def stages():
+    def payload(records):
+        return json.dumps(records).encode('utf-8')
+
+    def columns(records):
+        return crime_stats.flatten_records(records)
+
+    def table(records):
+        return crime_stats.tally(crime_stats.flatten_records(records)["codes"])
+
+    def frame(records):
+        return crime_stats.records_frame(crime_stats.flatten_records(records))
+
+    #Parsing the body in chunks, as "police_api.fetch_month_batches" does while the response is downloaded:
+    def stream_flatten(body):
+        parser = police_api.RecordParser()
+        columns = crime_stats.empty_columns()
+        for start in range(0, len(body), police_api.STREAM_CHUNK_BYTES):
+            for batch in parser.feed(body[start:start + police_api.STREAM_CHUNK_BYTES]):
+                crime_stats.extend_columns(columns, batch)
+        for batch in parser.close():
+            crime_stats.extend_columns(columns, batch)
+        return columns
+
+    return {
+        "json_decode": (payload, json.loads),
+        "flatten_records": (lambda records: records, crime_stats.flatten_records),
+        "decode_flatten": (payload, lambda body: crime_stats.flatten_records(json.loads(body))),
+        "stream_flatten": (payload, stream_flatten),
+        "compact_month": (columns, compact.CompactMonth.from_columns),
+        "tally_codes": (columns, lambda c: crime_stats.tally(c["codes"])),
+        "tally_locations": (columns, lambda c: crime_stats.tally(c["location_subtypes"])),
+        "tally_crimes": (columns, lambda c: crime_stats.tally(c["crime_categories"])),
+        "count_series": (columns, lambda c: crime_stats.CountSeries(crime_stats.tally(c["codes"]))),
+        "cleaned_counts": (columns, lambda c: crime_stats.CountSeries(crime_stats.tally(c["location_subtypes"])).cleaned_counts()),
+        "clean_col": (columns, lambda c: crime_stats.clean_col(c["crime_categories"])),
+        "count_table": (table, lambda t: crime_stats.CountSeries(t).table("consequence")),
+        "code_count": (columns, crime_stats.code_count),
+        "records_frame": (columns, crime_stats.records_frame),
+        "records_to_dict": (frame, lambda f: f.to_dict(orient = "index")),
+    }
+
+
+#Best wall time of a stage over several runs:
+def time_stage(run, data, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        run(data)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+#Peak memory allocated while a stage runs:
+def trace_stage(run, data):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = run(data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="micro")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--stages", nargs="*", help="names of the stages to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--out", default=None, help="path of the json report")
+    options = parser.parse_args(argv)
+
+    all_stages = stages()
+    selected = options.stages or list(all_stages)
+    report = {"sizes": options.sizes, "results": {}}
+
+    print("{:<18} {:>9} {:>12} {:>14} {:>12}".format("stage", "records", "seconds", "records/s", "peak MB"))
+    for size in options.sizes:
+        records = generate_records(size, seed=size)
+        for name in selected:
+            setup, run = all_stages[name]
+            data = setup(records)
+            seconds = time_stage(run, data, options.repeat)
+            peak = None if options.no_memory else trace_stage(run, data)
+            del data
+            report["results"].setdefault(name, {})[str(size)] = {"seconds": seconds, "peak_bytes": peak}
+            print("{:<18} {:>9} {:>12.4f} {:>14,.0f} {:>12}".format(
+                name, size, seconds, size / seconds if seconds else 0, "-" if peak is None else "{:.1f}".format(peak / 1e6)))
+        del records
+
+    if options.out:
+        with open(options.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#Startup time and memory of a worker, with the analytics libraries loaded lazily or preloaded.
+#
+#    python -m benchmarks.startup --repeat 5 --out startup.json
+#
+#Every run boots a fresh interpreter (like a new worker process) and reports the seconds spent importing app.py and
+#calling "create_app", the resident memory of the process afterwards and whether pandas/plotly were loaded.
+#The "first_data_call" scenario boots lazily and then times the first page of records of a month ("all_crime_data"),
+#which pays for importing pandas (the counts of a month no longer need it).
+
+#Importing required libraries:
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+#Code run by each worker, printing its measures as json:
+WORKER = r"""
+import json, os, resource, sys, time
+started = time.perf_counter()
+import app
+flask_app = app.create_app({'PRELOAD_ANALYTICS': SCENARIO == 'analytics'})
+boot = time.perf_counter() - started
+first_call = None
+if SCENARIO == 'first_data_call':
+    import crime_stats
+    from benchmarks.synthetic import generate_records
+    columns = crime_stats.flatten_records(generate_records(1000, seed=1))
+    started = time.perf_counter()
+    crime_stats.select_records(columns, '2018-11', '100', 'no_csv')
+    first_call = time.perf_counter() - started
+try:
+    with open('/proc/self/statm') as f:
+        rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+except (OSError, ValueError):
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps({'boot': boot, 'first_call': first_call, 'rss': rss, 'modules': len(sys.modules),
+                  'pandas': 'pandas' in sys.modules, 'plotly': 'plotly' in sys.modules}))
+"""
+
+SCENARIOS = ["users", "analytics", "first_data_call"]
+
+
+#Booting one worker in a fresh interpreter:
+def run_worker(scenario):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, "-c", "SCENARIO = {!r}\n".format(scenario) + WORKER], cwd=root)
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="startup")
+    parser.add_argument("--repeat", type=int, default=5, help="workers booted for each scenario")
+    parser.add_argument("--scenarios", nargs="*", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--out", default=None, help="path of the json report")
+    options = parser.parse_args(argv)
+
+    report = {}
+    print("{:<16} {:>10} {:>14} {:>8} {:>8} {:>7} {:>7}".format("scenario", "boot ms", "1st call ms", "RSS MB", "modules", "pandas", "plotly"))
+    for scenario in options.scenarios:
+        runs = [run_worker(scenario) for _ in range(options.repeat)]
+        first_calls = [run["first_call"] for run in runs if run["first_call"] is not None]
+        report[scenario] = {
+            "boot": statistics.median(run["boot"] for run in runs),
+            "first_call": statistics.median(first_calls) if first_calls else None,
+            "rss": statistics.median(run["rss"] for run in runs),
+            "modules": runs[-1]["modules"],
+            "pandas": runs[-1]["pandas"],
+            "plotly": runs[-1]["plotly"],
+        }
+        stats = report[scenario]
+        print("{:<16} {:>10.1f} {:>14} {:>8.1f} {:>8} {:>7} {:>7}".format(
+            scenario, stats["boot"] * 1000, "-" if stats["first_call"] is None else "{:.1f}".format(stats["first_call"] * 1000),
+            stats["rss"] / 1e6, stats["modules"], str(stats["pandas"]), str(stats["plotly"])))
+
+    if options.out:
+        with open(options.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
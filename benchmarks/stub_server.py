@@ -0,0 +1,122 @@
+#Local stub of the "outcomes-at-location" method of the Police API, replaying recorded or synthetic payloads.
+#
+#    python -m benchmarks.stub_server --port 8081 --records 1600 --latency 0.2 --jitter 0.05
+#    python -m benchmarks.stub_server --replay recordings/
+#    python -m benchmarks.stub_server record 201811 --out recordings/
+#
+#The app is pointed to the stub with the POLICE_API_URL environment variable (see config.py):
+#
+#    POLICE_API_URL=http://127.0.0.1:8081/api PLOTLY_OFFLINE=1 python app.py
+
+#Importing required libraries:
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from benchmarks.synthetic import generate_records
+
+
+#Encoded payloads, generated once per month:
+_payloads = {}
+_lock = threading.Lock()
+
+
+#Returning the payload of a month, from the recordings if there is one or else synthetic:
+def month_payload(month, options):
+    with _lock:
+        if month not in _payloads:
+            path = os.path.join(options.replay, '{}.json'.format(month)) if options.replay else None
+            if path and os.path.exists(path):
+                with open(path, 'rb') as f:
+                    _payloads[month] = f.read()
+            else:
+                _payloads[month] = json.dumps(generate_records(options.records, month)).encode('utf-8')
+        return _payloads[month]
+
+
+def make_handler(options):
+
+    class StubHandler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            month = parse_qs(url.query).get('date', [''])[0]
+            if not url.path.endswith('/outcomes-at-location') or not re.match(r'^\d{4}-\d{2}$', month):
+                self.send_error(404)
+                return
+
+            #Simulating the latency (and failures) of the real API:
+            time.sleep(max(0.0, options.latency + random.uniform(-options.jitter, options.jitter)))
+            if options.error_rate and random.random() < options.error_rate:
+                self.send_error(503)
+                return
+
+            body = month_payload(month, options)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if options.verbose:
+                BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    return StubHandler
+
+
+#Recording the real payload of a month so that it can be replayed offline:
+def record(date, out):
+    import requests
+    import police_api
+    os.makedirs(out, exist_ok=True)
+    resp = requests.get(police_api.crime_url(date))
+    resp.raise_for_status()
+    path = os.path.join(out, '{}.json'.format(police_api.format_date(date)))
+    with open(path, 'wb') as f:
+        f.write(resp.content)
+    print('Recorded {} records in {}'.format(len(resp.json()), path))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'record':
+        parser = argparse.ArgumentParser(prog='stub_server record')
+        parser.add_argument('dates', nargs='+', help='months to record, as YYYYMM')
+        parser.add_argument('--out', default='recordings')
+        options = parser.parse_args(argv[1:])
+        for date in options.dates:
+            record(date, options.out)
+        return
+
+    parser = argparse.ArgumentParser(prog='stub_server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--records', type=int, default=1600, help='records of each synthetic month')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random +/- seconds added to the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of responses answered with a 503')
+    parser.add_argument('--replay', default=None, help='directory of recorded <YYYY-MM>.json payloads')
+    parser.add_argument('--verbose', action='store_true')
+    options = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(options))
+    print('Police API stub listening on http://{}:{}/api'.format(options.host, options.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#Importing required libraries:
+import hashlib
+import random
+
+
+#Outcome codes and names returned by the "outcomes-at-location" method of the Police API:
+OUTCOMES = [
+    ("no-further-action", "Investigation complete; no suspect identified"),
+    ("unable-to-prosecute", "Unable to prosecute suspect"),
+    ("local-resolution", "Local resolution"),
+    ("cautioned", "Offender given a caution"),
+    ("charged", "Suspect charged"),
+    ("not-guilty", "Defendant found not guilty"),
+    ("community-penalty", "Offender given community sentence"),
+    ("conditional-discharge", "Offender given conditional discharge"),
+    ("unable-to-proceed", "Formal action is not in the public interest"),
+    ("penalty-notice-issued", "Offender given penalty notice"),
+    ("drugs-possession-warning", "Offender given a drugs possession warning"),
+    ("compensation", "Offender ordered to pay compensation"),
+    ("sent-to-crown-court", "Suspect charged as part of another case"),
+    ("further-investigation-not-in-public-interest", "Further investigation is not in the public interest"),
+]
+
+CRIME_CATEGORIES = ["anti-social-behaviour", "bicycle-theft", "burglary", "criminal-damage-arson", "drugs",
+                    "other-theft", "possession-of-weapons", "public-order", "robbery", "shoplifting",
+                    "theft-from-the-person", "vehicle-crime", "violent-crime", "other-crime"]
+
+LOCATION_SUBTYPES = ["ROAD", "", "STATION", "SUPERMARKET", "HOSPITAL", "NIGHTCLUB", "PARKING AREA",
+                     "SHOPPING AREA", "PUBLIC TRANSPORT (TUBE)", "LINE SIDE"]
+
+STREET_WORDS = ["Green Arbour Court", "Store Street", "Nightclub", "Oxford Street", "Strand", "Holborn",
+                "Fleet Street", "Parking Area", "Supermarket", "Petrol Station", "Shopping Area", "Bridge Street"]
+
+
+#Generating "n_records" synthetic records with the same schema as the response of the Police API.
+#Frequencies are skewed like the real data (a few outcomes, categories and streets hold most of the records):
+def generate_records(n_records, month="2018-11", seed=None, n_streets=2000):
+    rng = random.Random(seed if seed is not None else month)
+    streets = [(500000 + i, "On or near {} {}".format(STREET_WORDS[i % len(STREET_WORDS)], i))
+               for i in range(n_streets)]
+    street_weights = [1.0 / (i + 1) for i in range(n_streets)]
+    outcome_weights = [1.0 / (i + 1) for i in range(len(OUTCOMES))]
+    category_weights = [1.0 / (i + 1) for i in range(len(CRIME_CATEGORIES))]
+    subtype_weights = [1.0 / (i + 1) ** 2 for i in range(len(LOCATION_SUBTYPES))]
+
+    outcomes = rng.choices(OUTCOMES, outcome_weights, k=n_records)
+    categories = rng.choices(CRIME_CATEGORIES, category_weights, k=n_records)
+    subtypes = rng.choices(LOCATION_SUBTYPES, subtype_weights, k=n_records)
+    chosen_streets = rng.choices(streets, street_weights, k=n_records)
+
+    records = []
+    for i in range(n_records):
+        code, name = outcomes[i]
+        street_id, street_name = chosen_streets[i]
+        persistent_id = hashlib.sha256('{}-{}'.format(month, rng.randrange(n_records or 1)).encode()).hexdigest()
+        records.append({
+            "category": {"code": code, "name": name},
+            "date": month,
+            "person_id": rng.randrange(1, 100000) if rng.random() < 0.02 else None,
+            "crime": {
+                "category": categories[i],
+                "location_type": "Force" if subtypes[i] != "LINE SIDE" else "BTP",
+                "location": {
+                    "latitude": "{:.6f}".format(51.5 + rng.uniform(-0.02, 0.02)),
+                    "longitude": "{:.6f}".format(-0.12 + rng.uniform(-0.03, 0.03)),
+                    "street": {"id": street_id, "name": street_name},
+                },
+                "context": "",
+                "persistent_id": persistent_id,
+                "id": 69000000 + i,
+                "location_subtype": subtypes[i],
+                "month": month,
+            },
+        })
+    return records
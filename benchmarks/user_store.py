@@ -0,0 +1,111 @@
+#Concurrent logins and registrations against the SQLite user store.
+#
+#    python -m benchmarks.user_store --threads 16 --requests 2000
+#    python -m benchmarks.user_store --threads 16 --requests 2000 --legacy
+#
+#The app is created on a temporary database and driven in-process by one test client per thread, so only the
+#user store (and the password hashing) is measured. "--legacy" uses the previous setup (default journal, a new
+#connection for every request) to compare with. "--fast-hash" lowers the rounds of the password hashes so the
+#database, not the hashing, is the bottleneck.
+
+#Importing required libraries:
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.pool import NullPool
+from benchmarks.load_test import summarise
+
+
+def basic_auth(username, password):
+    return {'Authorization': 'Basic ' + base64.b64encode('{}:{}'.format(username, password).encode('utf-8')).decode('ascii')}
+
+
+#Running the requests of one operation at the given concurrency, returning its summary and status codes:
+def run_operation(flask_app, threads, requests, request):
+    local = threading.local()
+    latencies, statuses, errors = [], {}, [0]
+    lock = threading.Lock()
+
+    def one(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = flask_app.test_client()
+        started = time.perf_counter()
+        status = request(client, i)
+        latency = time.perf_counter() - started
+        with lock:
+            latencies.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status >= 500:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one, range(requests)))
+    stats = summarise(latencies, errors[0], time.perf_counter() - started)
+    stats["statuses"] = statuses
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="user_store")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests of each operation")
+    parser.add_argument("--users", type=int, default=50, help="users registered before the run")
+    parser.add_argument("--legacy", action="store_true", help="default journal mode and no connection pool")
+    parser.add_argument("--fast-hash", action="store_true", help="hash the passwords with few rounds")
+    parser.add_argument("--out", default=None, help="path of the json report")
+    options = parser.parse_args(argv)
+
+    from passlib.apps import custom_app_context as pwd_context
+    if options.fast_hash:
+        pwd_context.load({'schemes': ['sha512_crypt', 'sha256_crypt'], 'default': 'sha512_crypt',
+                          'sha512_crypt__default_rounds': 1000, 'sha256_crypt__default_rounds': 1000})
+
+    import app
+    path = os.path.join(tempfile.mkdtemp(), 'users.sqlite')
+    config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path, 'RATELIMIT_ENABLED': False}
+    if options.legacy:
+        config.update({'USER_DB_WAL': False, 'SQLALCHEMY_ENGINE_OPTIONS': {'poolclass': NullPool}})
+    flask_app = app.create_app(config)
+
+    #Registering the users logging in during the run and their tokens:
+    client = flask_app.test_client()
+    users = ['bench_{}'.format(i) for i in range(options.users)]
+    for username in users:
+        client.post('/api/users', json={'username': username, 'password': 'bench'})
+    tokens = [client.get('/api/token', headers=basic_auth(username, 'bench')).get_json()['token'] for username in users]
+    run_id = uuid.uuid4().hex[:8]
+
+    operations = {
+        "login_token": lambda c, i: c.get('/api/token', headers=basic_auth(tokens[i % len(tokens)], 'unused')).status_code,
+        "login_password": lambda c, i: c.get('/api/token', headers=basic_auth(users[i % len(users)], 'bench')).status_code,
+        "register": lambda c, i: c.post('/api/users', json={'username': 'new_{}_{}'.format(run_id, i), 'password': 'bench'}).status_code,
+        #Every username is registered by 4 requests at once, only one of them may succeed:
+        "register_duplicate": lambda c, i: c.post('/api/users', json={'username': 'dup_{}_{}'.format(run_id, i // 4), 'password': 'bench'}).status_code,
+    }
+
+    report = {"meta": {"threads": options.threads, "requests": options.requests, "legacy": options.legacy,
+                       "fast_hash": options.fast_hash}, "operations": {}}
+    print("{:<20} {:>6} {:>6} {:>9} {:>9} {:>9}  {}".format("operation", "reqs", "errors", "req/s", "p50 ms", "p95 ms", "statuses"))
+    for name, request in operations.items():
+        stats = report["operations"][name] = run_operation(flask_app, options.threads, options.requests, request)
+        print("{:<20} {:>6} {:>6} {:>9.1f} {:>9.1f} {:>9.1f}  {}".format(
+            name, stats["requests"], stats["errors"], stats["throughput"], stats["p50"] * 1000, stats["p95"] * 1000,
+            json.dumps(stats["statuses"], sort_keys=True)))
+
+    if options.out:
+        with open(options.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#Importing required libraries:
+import os
+import tempfile
+import uuid
+import metrics
+
+
+#Colors of the bars (as "red, green, blue" values):
+BLUE = "55, 128, 191"
+ORANGE = "255, 153, 51"
+RED = "255, 0, 0"
+
+
+#Construct a bar trace for the Graph where x equal to the labels and y is equal to the values:
+def bar_trace(x, y, name, color):
+    return {
+              "x": x,
+              "y": y,
+              "marker": {
+                "color": "rgba({}, 0.6)".format(color),
+                "line": {
+                  "color": "rgba({}, 1.0)".format(color),
+                  "width": 1
+                }
+              },
+              "name": name,
+              "orientation": "v",
+              "type": "bar"
+            }
+
+
+#The figures are built as plain dictionaries straight from the count series of the month (see crime_stats.CountSeries),
+#so neither the counts nor the figures go through pandas or the validation of "plotly.graph_objs".
+
+#Building the stacked bar-chart of a count series ("subject" is ex. "Consequences", "Sub_Location", "Category"):
+@metrics.timed('figure')
+def count_figure(series, subject, my_date):
+    trace1 = bar_trace(series.labels, series.counts, 'Crime {} Count During {}'.format(subject, my_date), BLUE)
+    trace2 = bar_trace(series.labels, series.percentages, 'Crime {} Percentages During {}'.format(subject, my_date), ORANGE)
+
+    #Dictating the layout for the Figure (stacked bar-chart):
+    layout = {"barmode": "stack", "title": 'Crime {} During {}'.format(subject, my_date)}
+
+    #Setting the parameters for the figure:
+    return {"data": [trace1, trace2], "layout": layout}
+
+
+#Building the figure with all 3 condensed counts of a month (from the count series of "crime_stats.month_series"):
+@metrics.timed('figure')
+def all_stats_figure(series, my_date):
+    location_type = series["location_subtypes"].cleaned_counts()
+    crime_category = series["crime_categories"].cleaned_counts()
+    consequences = series["codes"].cleaned_counts()
+
+    trace1 = bar_trace(list(location_type.keys()), list(location_type.values()),
+                       'Crime Sub_Location Count During {}'.format(my_date), BLUE)
+    trace2 = bar_trace(list(crime_category.keys()), list(crime_category.values()),
+                       'Crime Crime_Category Count During {}'.format(my_date), RED)
+    trace3 = bar_trace(list(consequences.keys()), list(consequences.values()),
+                       'Crime Consequences Count During {}'.format(my_date), ORANGE)
+
+    #Dictating the layout for the Figure:
+    layout = {"title": 'Crime All Stats During {}'.format(my_date)}
+
+    return {"data": [trace1, trace2, trace3], "layout": layout}
+
+
+#Sign in to my personal Plotly API and plot the figure, returning the link of the hosted webpage (the figures of this
+#module only hold bar traces in the schema of Plotly, so they are not validated again):
+@metrics.timed('plot')
+def plot_figure(fig, api_key, offline=False):
+    import plotly.offline
+    import plotly.plotly as py
+
+    #Offline the figure is saved as a local html file and its path is returned instead:
+    if offline:
+        filename = os.path.join(tempfile.gettempdir(), 'plot_{}.html'.format(uuid.uuid4().hex))
+        return plotly.offline.plot(fig, filename=filename, auto_open=False, validate=False)
+
+    py.sign_in('kseniyakamen', api_key)
+    return py.plot(fig, validate=False)
@@ -0,0 +1,125 @@
+#Importing required libraries:
+import contextvars
+import math
+import threading
+import time
+from email.utils import formatdate
+from flask import current_app
+import metrics
+import police_api
+import store
+
+
+#Circuit breaker of the Police API and the degraded serving of the months while it is unhealthy.
+#Every worker counts the consecutive failures of its upstream calls (answers 5xx, timeouts and refused connections):
+#    closed     the calls go to the Police API
+#    open       after "failure_threshold" failures the calls fail fast (only the cached responses are served) for
+#               "reset_seconds"
+#    half_open  then up to "half_open_probes" calls go through: a success closes the circuit, a failure opens it again
+#A month that cannot be fetched is served from the month store (the last complete copy ingested), and the response
+#is flagged as stale with the headers of "staleness_headers".
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+#Months of the current request served from the store, as "month: ingested_at" (set for every request):
+stale_months = contextvars.ContextVar('stale_months', default=None)
+
+#Months rebuilt from the store, kept for "STALE_CACHE_SECONDS" so the requests made while the Police API is unhealthy
+#do not read them again, as "month: (columns, ingested_at)" (forgotten when a snapshot replaces the store):
+STALE_CACHE_MONTHS = 16
+_stale_cache = store.GenerationCache(STALE_CACHE_MONTHS)
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.lock = threading.Lock()
+        metrics.UPSTREAM_CIRCUIT.set(STATES[CLOSED])
+
+    def _move(self, state):
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        self.probes = 0
+        metrics.UPSTREAM_CIRCUIT.set(STATES[state])
+
+    #Checking if a call may go to the Police API (while half-open, each allowed call takes one of the probes):
+    def allow(self):
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._move(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.probes < self.half_open_probes:
+                self.probes += 1
+                return True
+            return False
+
+    #Recording the outcome of an allowed call: "True" if the Police API answered, "False" if it failed and "None"
+    #if the call taught nothing (ex. it was answered by "requests_cache"):
+    def record(self, ok):
+        with self.lock:
+            if ok is None:
+                if self.state == HALF_OPEN and self.probes > 0:
+                    self.probes -= 1
+            elif ok:
+                self.failures = 0
+                if self.state == HALF_OPEN:
+                    self._move(CLOSED)
+            else:
+                self.failures += 1
+                if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                    self._move(OPEN)
+
+    #Seconds before the circuit lets the next probe through:
+    def retry_after(self):
+        with self.lock:
+            if self.state != OPEN:
+                return 1
+            return max(1, int(math.ceil(self.reset_seconds - (time.monotonic() - self.opened_at))))
+
+
+#Reading the last complete copy of a month from the store (or from the months rebuilt recently), with the time it
+#was ingested, or "None" if the month has never been ingested:
+def stored_columns(month):
+    stored = _stale_cache.get(month)
+    metrics.cache_lookup('stale', stored is not None)
+    if stored is None:
+        stored = store.month_columns(month)
+        if stored is not None:
+            _stale_cache.put(month, stored, current_app.config['STALE_CACHE_SECONDS'])
+    return stored
+
+
+#Serving the last complete copy of a month from the store when the Police API fails (errors 5xx, timeouts, open
+#circuit); any other error, or a month that has never been ingested, is raised again:
+def stale_columns(date, error):
+    month = police_api.format_date(date)
+    stored = stored_columns(month) if error.status_code >= 500 else None
+    if stored is None:
+        raise error
+    columns, ingested_at = stored
+    stale = stale_months.get()
+    if stale is not None:
+        stale[month] = ingested_at
+    metrics.STALE_MONTHS.inc(metrics.current_route.get())
+    return columns
+
+
+#Headers of a response holding stale months: the months, the age of the oldest one and a "110" warning:
+def staleness_headers(stale):
+    if not stale:
+        return {}
+    oldest = min(stale.values())
+    return {'X-Stale-Months': ','.join(sorted(stale)),
+            'X-Stale-Since': formatdate(oldest, usegmt=True),
+            'Age': str(max(0, int(time.time() - oldest))),
+            'Warning': '110 - "Response is Stale"'}
@@ -0,0 +1,205 @@
+#Importing required libraries:
+import sys
+from array import array
+from collections import Counter
+import crime_stats
+
+
+#Compact in-memory representation of the flattened records of a month (see crime_stats.flatten_records).
+#
+#A decoded response stores every record as three levels of dicts and the same strings (categories, location types,
+#street names, months) thousands of times. A "CompactMonth" keeps one column per field instead:
+#    EncodedColumn     the distinct strings of the column once, and the index of the value of each record in an array
+#    CoordinateColumn  the latitudes and longitudes as floats in an array (returned as the original strings)
+#    IntegerColumn     the ids as 64-bit integers in an array
+#The columns are sequences, so the code written for the lists of "flatten_records" reads them the same way.
+
+#The columns of the records stored as numbers (every other column is dictionary-encoded):
+COORDINATE_COLUMNS = ["latitudes", "longitudes"]
+INTEGER_COLUMNS = ["person_ids", "street_ids", "crime_ids"]
+
+
+#Dictionary-encoded column of strings (or "None"):
+class EncodedColumn(object):
+
+    __slots__ = ('values', 'codes', '_index')
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('H')
+        self._index = {}
+
+    #Appending values, adding the new distinct ones to the dictionary first:
+    def extend(self, items):
+        if self._index is None:
+            self._index = {value: code for code, value in enumerate(self.values)}
+        index = self._index
+        for value in set(items).difference(index):
+            index[value] = len(self.values)
+            self.values.append(value)
+        if len(self.values) > 0xFFFF and self.codes.typecode == 'H':
+            self.codes = array('I', self.codes)
+        self.codes.extend(map(index.__getitem__, items))
+
+    #Dropping the lookup table of the values once the column is complete (it is built again if values are added):
+    def seal(self):
+        self._index = None
+
+    #Counting the apperance of each value from the codes (each distinct string is only hashed once):
+    def counts(self):
+        values = self.values
+        return Counter({values[code]: count for code, count in Counter(self.codes).items()})
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.values[code] for code in self.codes[i]]
+        return self.values[self.codes[i]]
+
+    def nbytes(self):
+        return (sys.getsizeof(self.codes) + sys.getsizeof(self.values) + sys.getsizeof(self._index or {})
+                + sum(sys.getsizeof(value) for value in self.values))
+
+
+#Column of decimal strings (ex. "51.509865") kept as floats and their amount of decimals, so every value is returned
+#exactly as it was received. The few values that do not round-trip (ex. "None" or "1e-3") are kept as they are:
+class CoordinateColumn(object):
+
+    __slots__ = ('numbers', 'decimals', 'others')
+
+    def __init__(self):
+        self.numbers = array('d')
+        self.decimals = array('b')
+        self.others = {}
+
+    def extend(self, items):
+        numbers, decimals, others = self.numbers, self.decimals, self.others
+        for value in items:
+            try:
+                number = float(value)
+                places = len(value) - value.index('.') - 1 if '.' in value else 0
+                exact = places < 128 and '{:.{}f}'.format(number, places) == value
+            except (TypeError, ValueError):
+                exact = False
+            if not exact:
+                others[len(numbers)] = value
+                number, places = 0.0, 0
+            numbers.append(number)
+            decimals.append(places)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        others = self.others
+        for i, (number, places) in enumerate(zip(self.numbers, self.decimals)):
+            yield others[i] if others and i in others else '{:.{}f}'.format(number, places)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = range(len(self))[i]
+        if i in self.others:
+            return self.others[i]
+        return '{:.{}f}'.format(self.numbers[i], self.decimals[i])
+
+    def nbytes(self):
+        return (sys.getsizeof(self.numbers) + sys.getsizeof(self.decimals) + sys.getsizeof(self.others)
+                + sum(sys.getsizeof(value) for value in self.others.values()))
+
+
+#Column of integer ids in an array, the missing ones ("None") are stored as the smallest 64-bit integer:
+class IntegerColumn(object):
+
+    __slots__ = ('numbers', 'missing')
+
+    MISSING = -2 ** 63
+
+    def __init__(self):
+        self.numbers = array('q')
+        self.missing = 0
+
+    def extend(self, items):
+        start = len(self.numbers)
+        try:
+            self.numbers.extend(items)
+        except (TypeError, OverflowError): #Some ids are missing (or are not integers, which is raised again)
+            del self.numbers[start:]
+            numbers = [self.MISSING if value is None else value for value in items]
+            try:
+                self.numbers.extend(numbers)
+            except (TypeError, OverflowError):
+                del self.numbers[start:]
+                raise
+            self.missing += sum(1 for value in items if value is None)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        if not self.missing:
+            return iter(self.numbers)
+        missing = self.MISSING
+        return (None if number == missing else number for number in self.numbers)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [None if number == self.MISSING else number for number in self.numbers[i]]
+        number = self.numbers[i]
+        return None if number == self.MISSING else number
+
+    def nbytes(self):
+        return sys.getsizeof(self.numbers)
+
+
+#The columns of a month, by name (like the dictionary returned by "flatten_records"). The count series of its columns
+#(see crime_stats.count_series) are kept in "series" once they are computed:
+class CompactMonth(dict):
+
+    def __init__(self):
+        dict.__init__(self)
+        self.series = {}
+        for name in crime_stats.RECORD_COLUMNS:
+            if name in COORDINATE_COLUMNS:
+                self[name] = CoordinateColumn()
+            elif name in INTEGER_COLUMNS:
+                self[name] = IntegerColumn()
+            else:
+                self[name] = EncodedColumn()
+
+    #Building the compact month of flattened columns:
+    @classmethod
+    def from_columns(cls, columns):
+        return cls().extend(columns).seal()
+
+    #Appending a batch of flattened records (a column holding values of another type falls back to a list):
+    def extend(self, batch):
+        self.series.clear()
+        for name in crime_stats.RECORD_COLUMNS:
+            column = self[name]
+            try:
+                column.extend(batch[name])
+            except (TypeError, OverflowError):
+                self[name] = list(column) + list(batch[name])
+        return self
+
+    #Releasing the memory only needed while the month is built (once every batch has been appended):
+    def seal(self):
+        for column in self.values():
+            if hasattr(column, 'seal'):
+                column.seal()
+        return self
+
+    def n_records(self):
+        return len(self["codes"])
+
+    #Approximate amount of memory held by the columns:
+    def nbytes(self):
+        return sys.getsizeof(self) + sum(column.nbytes() if hasattr(column, 'nbytes') else
+                                         sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column)
+                                         for column in self.values())
@@ -1 +1,74 @@
+import os
+
 DEBUG = False
+
+#Base url of the Police API (the benchmarks point it to a local stub server, see benchmarks/stub_server.py):
+POLICE_API_URL = os.environ.get('POLICE_API_URL', 'https://data.police.uk/api')
+
+#Saving the graphs as local html files instead of plotting them on the Plotly servers:
+PLOTLY_OFFLINE = os.environ.get('PLOTLY_OFFLINE') == '1'
+
+#Share of the requests profiled under cProfile and tracemalloc (ex. 0.001), the artifacts are written to "profiles":
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+#Memory budgets (in MB) of the requests building records, for the whole worker and for each user, and how long
+#a request waits for the budget before being answered with a 429:
+ADMISSION_PROCESS_MB = int(os.environ.get('ADMISSION_PROCESS_MB', 512))
+ADMISSION_USER_MB = int(os.environ.get('ADMISSION_USER_MB', 256))
+ADMISSION_QUEUE_SECONDS = float(os.environ.get('ADMISSION_QUEUE_SECONDS', 10))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 32))
+
+#Token buckets of the rate limits, shared by the workers of the machine through a memory-mapped file: the amount of
+#tokens each bucket holds and the tokens it gets back every second (see ratelimit.py for the cost of the requests):
+RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+RATELIMIT_PATH = os.environ.get('RATELIMIT_PATH', 'ratelimit.mmap')
+RATELIMIT_USER_CAPACITY = int(os.environ.get('RATELIMIT_USER_CAPACITY', 100))
+RATELIMIT_USER_RATE = float(os.environ.get('RATELIMIT_USER_RATE', 0.5))
+RATELIMIT_GLOBAL_CAPACITY = int(os.environ.get('RATELIMIT_GLOBAL_CAPACITY', 1000))
+RATELIMIT_GLOBAL_RATE = float(os.environ.get('RATELIMIT_GLOBAL_RATE', 5))
+
+#Longest range of months whose distinct ids are counted exactly by "/api/distinct" in "auto" mode (longer ranges are
+#estimated from the HyperLogLog registers of the months):
+EXACT_DISTINCT_MAX_MONTHS = int(os.environ.get('EXACT_DISTINCT_MAX_MONTHS', 3))
+
+#Importing pandas, numpy and plotly when the worker boots instead of on the first data request:
+PRELOAD_ANALYTICS = os.environ.get('PRELOAD_ANALYTICS') == '1'
+
+#Connections kept open to the user store by each worker (match the threads of the worker) and its journal mode:
+USER_DB_POOL_SIZE = int(os.environ.get('USER_DB_POOL_SIZE', 8))
+USER_DB_WAL = os.environ.get('USER_DB_WAL', '1') == '1'
+
+#Processes hashing the passwords of the bulk provisionings (0 uses every core):
+BULK_HASH_PROCESSES = int(os.environ.get('BULK_HASH_PROCESSES', 0))
+
+#Seconds after which a provisioning job still queued or running is failed (the worker running it has died):
+BULK_JOB_TIMEOUT_SECONDS = int(os.environ.get('BULK_JOB_TIMEOUT_SECONDS', 6 * 3600))
+
+#Users returned by each page of the admin listings ("?limit=" can ask for up to USER_LIST_MAX_LIMIT):
+USER_LIST_LIMIT = int(os.environ.get('USER_LIST_LIMIT', 1000))
+USER_LIST_MAX_LIMIT = int(os.environ.get('USER_LIST_MAX_LIMIT', 10000))
+
+#Name of the SQLite database of "requests_cache" (written to "<name>.sqlite") and the seconds the responses of the
+#Police API are kept in it (the responses imported from a snapshot are kept for as long, counted from the import):
+REQUESTS_CACHE_NAME = os.environ.get('REQUESTS_CACHE_NAME', 'crime_api_cache')
+REQUESTS_CACHE_EXPIRE_SECONDS = int(os.environ.get('REQUESTS_CACHE_EXPIRE_SECONDS', 36000))
+
+#Snapshot of the cached months imported when the worker boots with an empty month store (see snapshot.py), and the
+#bytes of the month store each connection reads through a memory map:
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH')
+STORE_MMAP_MB = int(os.environ.get('STORE_MMAP_MB', 256))
+
+#Seconds waiting for a connection to the Police API or for the next bytes of a response, and its circuit breaker:
+#after BREAKER_FAILURES consecutive failures (answers 5xx, timeouts, refused connections) the upstream calls fail fast
+#for BREAKER_RESET_SECONDS, then BREAKER_HALF_OPEN_PROBES calls are let through to probe it (see circuit.py):
+UPSTREAM_TIMEOUT_SECONDS = float(os.environ.get('UPSTREAM_TIMEOUT_SECONDS', 10))
+BREAKER_ENABLED = os.environ.get('BREAKER_ENABLED', '1') == '1'
+BREAKER_FAILURES = int(os.environ.get('BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', 30))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get('BREAKER_HALF_OPEN_PROBES', 1))
+
+#Seconds the months rebuilt from the month store are kept in memory while the Police API is unhealthy:
+STALE_CACHE_SECONDS = float(os.environ.get('STALE_CACHE_SECONDS', 60))
+
+#Threads of the ASGI app running the requests of the mounted Flask app (see asgi.py):
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 8))
@@ -0,0 +1,219 @@
+#Importing required libraries:
+import itertools
+from collections import Counter
+import metrics
+
+
+#The columns of a flattened crime record (see Mini_Project.ipynb):
+RECORD_COLUMNS = ["codes", "procedures", "dates", "person_ids", "crime_categories", "location_types",
+                  "latitudes", "longitudes", "street_ids", "street_names", "contexts", "persistent_ids",
+                  "crime_ids", "location_subtypes", "months"]
+
+
+#Defining support Function "clean_col":
+def clean_col(inputlst):
+    col_list = []
+    for col in inputlst:
+        col = col.strip()
+        col = col.lower()
+        col = col.replace(" ", "_")
+        col = col.replace("(", "")
+        col = col.replace(")", "")
+        col = col.replace("-", "_")
+        col = col.strip()
+        col_list.append(col)
+    return col_list
+
+
+#Cleaning a single value the way the "all_graphs" endpoint does (dashes are kept):
+def clean_label(row):
+    row = row.strip()
+    row = row.lower()
+    row = row.replace(" ", "_")
+    row = row.replace("(", "")
+    row = row.replace(")", "")
+    return row.strip()
+
+
+#Creating an empty list for every column of the records:
+def empty_columns():
+    return {name: [] for name in RECORD_COLUMNS}
+
+
+#Appending a batch of flattened records to the columns of a month:
+def extend_columns(columns, batch):
+    for name in RECORD_COLUMNS:
+        columns[name].extend(batch[name])
+
+
+#Flattening the response of the Police API into one list per column:
+@metrics.timed('flatten')
+def flatten_records(all_crime_data):
+
+    #Creating a set of list to assign each value for each entry in the dictionary:
+    columns = empty_columns()
+    codes = columns["codes"]
+    procedures = columns["procedures"]
+    dates = columns["dates"]
+    person_ids = columns["person_ids"]
+    crime_categories = columns["crime_categories"]
+    location_types = columns["location_types"]
+    latitudes = columns["latitudes"]
+    longitudes = columns["longitudes"]
+    street_ids = columns["street_ids"]
+    street_names = columns["street_names"]
+    contexts = columns["contexts"]
+    persistent_ids = columns["persistent_ids"]
+    crime_ids = columns["crime_ids"]
+    location_subtypes = columns["location_subtypes"]
+    months = columns["months"]
+
+    #Appending the values of every entry that has been returned from the response to the respective list:
+    for record in all_crime_data:
+        category = record["category"]
+        crime = record["crime"]
+        location = crime["location"]
+        street = location["street"]
+
+        codes.append(category["code"])
+        procedures.append(category["name"])
+        dates.append(record["date"])
+        person_ids.append(record["person_id"])
+        crime_categories.append(crime["category"])
+        location_types.append(crime["location_type"])
+        latitudes.append(location["latitude"])
+        longitudes.append(location["longitude"])
+        street_ids.append(street["id"])
+        street_names.append(street["name"])
+        contexts.append(crime["context"])
+        persistent_ids.append(crime["persistent_id"])
+        crime_ids.append(crime["id"])
+        location_subtypes.append(crime["location_subtype"])
+        months.append(crime["month"])
+
+    return columns
+
+
+#Creating a Dataframe that holds the entries of the response from "start" to "stop" (every single one by default),
+#indexed by their position in the month:
+def records_frame(columns, start=0, stop=None):
+    import pandas as pd #Imported on first use (see app.py)
+    total = len(columns[RECORD_COLUMNS[0]])
+    stop = total if stop is None else max(0, min(stop, total))
+    start = max(0, min(start, stop))
+    return pd.DataFrame({name: list(itertools.islice(columns[name], start, stop)) for name in RECORD_COLUMNS},
+                        columns = RECORD_COLUMNS, index = range(start, stop))
+
+
+#Selecting the records requested by the "all_crime_data" endpoint:
+@metrics.timed('pandas')
+def select_records(columns, my_date, n_records, csv):
+
+    #If the second paramter of the function ("n_records") is equal to "All":
+    if n_records == "All":
+        df_final = records_frame(columns)
+
+        #Return the all the records in dictionary in a json format.
+        if csv == "csv":
+            df_final.to_csv(f'all_records_during_{my_date}', index=False)
+            return "All records have been saved in a .csv format"
+        else:
+            return df_final.to_dict(orient = "index")
+
+    #Else if the "n_records" is a interger stored as an string and is within the amounts of total records (only
+    #the records requested are converted):
+    elif int(n_records) in range(len(columns[RECORD_COLUMNS[0]])):
+        n_record = int(n_records)
+        df_final = records_frame(columns, 0, n_record)
+        if csv == "csv":
+            df_final.to_csv(f'{n_record}_records_during_{my_date}',index=False)
+            return "All records have been saved in a .csv format"
+        else:
+            return list(df_final.to_dict(orient = "index").items())
+
+    #In the case the "n_records" paramter is not "All" or a string stored as an interger that is bigger then then the total amount of records return a suggestion:
+    else:
+        return '<README>Do Not Panic! Your request has been successful. Unfortunatley the n_records paramter exeeds the amount of records in the dictionary. Try again by using either "All" in your path to retrive all records or inserting the amount of records you want to request.<README>'
+
+
+#Counting the apperance of each entry of a column (the dictionary-encoded columns of compact.py count their codes):
+def tally(values):
+    if hasattr(values, 'counts'):
+        return values.counts()
+    return Counter(values)
+
+
+#Chart-ready count of a column of a month, read by both the count endpoints and the graphs: the distinct values in
+#order of appearance with their "counts", cleaned "labels" (see "clean_col") and "percentages", and the "order" of the
+#values by percentage (the order of the count tables):
+class CountSeries(object):
+
+    __slots__ = ('values', 'labels', 'counts', 'percentages', 'order')
+
+    def __init__(self, counts):
+        self.values = list(counts)
+        self.counts = list(counts.values())
+        total = sum(self.counts)
+        self.percentages = [count / total for count in self.counts]
+        self.labels = clean_col(self.values)
+        self.order = sorted(range(len(self.counts)), key=self.percentages.__getitem__)
+
+    #Count table of the endpoints (ex. {3: {"consequence": "no_further_action", "count": 12, "percentage": 0.01}}),
+    #in ascending order of percentage and keyed by the position of the value:
+    def table(self, label):
+        labels, counts, percentages = self.labels, self.counts, self.percentages
+        return {i: {label: labels[i], "count": counts[i], "percentage": percentages[i]} for i in self.order}
+
+    #Counts of the values cleaned the way the "all_graphs" endpoint does (values cleaned the same way are merged):
+    def cleaned_counts(self):
+        counts = Counter()
+        for value, count in zip(self.values, self.counts):
+            counts[clean_label(value)] += count
+        return counts
+
+
+#The column counted by each count endpoint and the label of the counted values:
+COUNTS = {
+    "code_count": ("codes", "consequence"),
+    "location_count": ("location_subtypes", "location"),
+    "crime_count": ("crime_categories", "crime"),
+}
+
+
+#The columns counted by the endpoints:
+COUNTED_COLUMNS = [column for column, label in COUNTS.values()]
+
+
+#Count series of a column of a month (kept by the compact months, so every endpoint reading it counts it once):
+def count_series(columns, column):
+    cache = getattr(columns, 'series', None)
+    if cache is not None and column in cache:
+        return cache[column]
+    series = CountSeries(tally(columns[column]))
+    if cache is not None:
+        cache[column] = series
+    return series
+
+
+#Count series of every counted column of a month:
+@metrics.timed('count')
+def month_series(columns):
+    return {column: count_series(columns, column) for column in COUNTED_COLUMNS}
+
+
+#Condensed count of the ["Crime code"] of each crime:
+@metrics.timed('count')
+def code_count(columns):
+    return count_series(columns, "codes").table("consequence")
+
+
+#Condensed count of the ["Sub_location"] of each crime:
+@metrics.timed('count')
+def location_count(columns):
+    return count_series(columns, "location_subtypes").table("location")
+
+
+#Condensed count of the ["Crime_Description"] of each crime:
+@metrics.timed('count')
+def crime_count(columns):
+    return count_series(columns, "crime_categories").table("crime")
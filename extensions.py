@@ -0,0 +1,8 @@
+#Importing required libraries:
+from flask_httpauth import HTTPBasicAuth
+from flask_sqlalchemy import SQLAlchemy
+
+
+#Creating Extensions (they are bound to the app by "create_app" in app.py):
+db = SQLAlchemy()
+auth = HTTPBasicAuth()
@@ -0,0 +1,182 @@
+#Importing required libraries:
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+import time
+
+
+#Lightweight in-process metrics exposed in the Prometheus text format by the "/metrics" endpoint.
+#Recording a value only takes a lock and a few additions, so the instrumentation is left on in production.
+#Every worker process keeps its own values and "/metrics" reports those of the worker answering the scrape (Prometheus
+#does not sum the workers behind one address), so run one worker per scraped port to see every worker.
+
+#Upper bounds (in seconds) of the buckets of the histograms:
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+#Route the current request (or coroutine) is serving, used to label the stages:
+current_route = contextvars.ContextVar('current_route', default='none')
+
+_lock = threading.Lock()
+
+
+#Formatting the labels of a sample (ex. {route="get_code",stage="upstream"}):
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+
+class Counter(object):
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        return [(self.name + _labels(self.labelnames, key), value) for key, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with _lock:
+            self.values[labels] = value
+
+
+class Histogram(object):
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, tuple(labels), buckets
+        self.values = {}
+
+    def observe(self, value, *labels):
+        with _lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += 1
+            entry[2] += value
+
+    def samples(self):
+        samples = []
+        for key, (counts, count, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                samples.append((self.name + '_bucket' + _labels(self.labelnames, key, [('le', bound)]), cumulative))
+            samples.append((self.name + '_bucket' + _labels(self.labelnames, key, [('le', '+Inf')]), count))
+            samples.append((self.name + '_count' + _labels(self.labelnames, key), count))
+            samples.append((self.name + '_sum' + _labels(self.labelnames, key), total))
+        return samples
+
+
+#The metrics of the app:
+REQUEST_SECONDS = Histogram('crime_api_request_seconds', 'Duration of the requests.', ['route', 'status'])
+STAGE_SECONDS = Histogram('crime_api_stage_seconds', 'Duration of each stage of the requests.', ['route', 'stage'])
+CACHE_REQUESTS = Counter('crime_api_cache_requests_total', 'Lookups of the months in the caches.', ['cache', 'result'])
+UPSTREAM_IN_FLIGHT = Gauge('crime_api_upstream_in_flight', 'Requests to the Police API currently waiting for an answer.')
+UPSTREAM_ERRORS = Counter('crime_api_upstream_errors_total', 'Answers of the Police API other than a 200.', ['status'])
+CACHE_HIT_RATIO = Gauge('crime_api_cache_hit_ratio', 'Share of the lookups answered by each cache.', ['cache'])
+CACHE_FILE_BYTES = Gauge('crime_api_cache_file_bytes', 'Size of the SQLite files holding the cached months.', ['file'])
+ADMISSION_REQUESTS = Counter('crime_api_admission_requests_total', 'Heavy requests admitted, queued or rejected.', ['route', 'result'])
+ADMISSION_BYTES = Gauge('crime_api_admission_bytes', 'Estimated memory of the heavy requests in progress.')
+UPSTREAM_CIRCUIT = Gauge('crime_api_upstream_circuit_state', 'State of the circuit breaker of the Police API (0 closed, 1 half-open, 2 open).')
+UPSTREAM_FAST_FAILS = Counter('crime_api_upstream_fast_fails_total', 'Months failed without calling the Police API while the circuit was open.')
+STALE_MONTHS = Counter('crime_api_stale_months_total', 'Months served from the store because the Police API failed.', ['route'])
+
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, CACHE_REQUESTS, CACHE_HIT_RATIO, UPSTREAM_IN_FLIGHT, UPSTREAM_ERRORS,
+            CACHE_FILE_BYTES, ADMISSION_REQUESTS, ADMISSION_BYTES, UPSTREAM_CIRCUIT, UPSTREAM_FAST_FAILS, STALE_MONTHS]
+
+#Timing a stage (ex. "auth", "upstream", "json_decode", "pandas", "plot", "jsonify") of the current route:
+@contextlib.contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, current_route.get(), name)
+
+
+#Decorator version of "stage":
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+#Timing the items read from an iterator (ex. the batches parsed while the body of a response is downloaded) as one
+#stage, observed once the iterator is done: the time the caller spends between two items is not counted:
+def timed_iter(name, items):
+    seconds, started = 0.0, time.perf_counter()
+    try:
+        for item in items:
+            seconds += time.perf_counter() - started
+            yield item
+            started = time.perf_counter()
+        seconds += time.perf_counter() - started
+    finally:
+        STAGE_SECONDS.observe(seconds, current_route.get(), name)
+
+
+#Async version of "timed_iter":
+async def timed_aiter(name, items):
+    seconds, started = 0.0, time.perf_counter()
+    try:
+        async for item in items:
+            seconds += time.perf_counter() - started
+            yield item
+            started = time.perf_counter()
+        seconds += time.perf_counter() - started
+    finally:
+        STAGE_SECONDS.observe(seconds, current_route.get(), name)
+
+
+#Counting a lookup of a cache ("hit" or "miss"):
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
+
+
+#Rendering every metric in the Prometheus text format, with the size of the SQLite files holding the cached months
+#("name: path"):
+def render(cache_files):
+    with _lock:
+        caches = {}
+        for (cache, result), value in CACHE_REQUESTS.values.items():
+            caches.setdefault(cache, {'hit': 0, 'miss': 0})[result] = value
+    for cache, counts in caches.items():
+        CACHE_HIT_RATIO.set(counts['hit'] / float(counts['hit'] + counts['miss'] or 1), cache)
+    for name, path in cache_files.items():
+        CACHE_FILE_BYTES.set(os.path.getsize(path) if os.path.exists(path) else 0, name)
+
+    lines = []
+    with _lock:
+        for metric in REGISTRY:
+            lines.append('# HELP {} {}'.format(metric.name, metric.help))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+            for sample, value in metric.samples():
+                lines.append('{} {}'.format(sample, value))
+    return '\n'.join(lines) + '\n'
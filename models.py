@@ -0,0 +1,138 @@
+#Importing required libraries:
+from flask import current_app, g
+from sqlalchemy import event, inspect
+from passlib.apps import custom_app_context as pwd_context
+from itsdangerous import (TimedJSONWebSignatureSerializer as Serializer, BadSignature, SignatureExpired)
+from extensions import db, auth
+import metrics
+
+
+#Creating a Class object "User": 
+class User(db.Model):
+    
+    #Defining the tablename in the User Object:
+    __tablename__ = 'users'
+    
+    #Defining the different columns for the table:
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(32), unique=True, index=True) #Unique, so concurrent registrations cannot both succeed
+    password_hash = db.Column(db.String(64))
+
+    #Method takes a plain password as argument:
+    def hash_password(self, password):
+        #It stores a hash of it with the user:
+        self.password_hash = pwd_context.encrypt(password)
+
+    #Method takes a plain password as argument:
+    def verify_password(self, password):
+        #It returns "True" if the password is correct or "False" if not:
+        return pwd_context.verify(password, self.password_hash)
+
+    #Method generates an encrypted version of a dictionary with an expiration time of 600seconds:
+    def generate_auth_token(self, expiration=600):
+        s = Serializer(current_app.config['SECRET_KEY'], expires_in=expiration)
+        #The dictionary that is return has the id of the user:
+        return s.dumps({'id': self.id})
+
+    #Method generates a verification for the token:
+    @staticmethod # A static method is used because the user will only be known once the token is decoded
+    def verify_auth_token(token):
+        s = Serializer(current_app.config['SECRET_KEY'])
+        try:
+            data = s.loads(token)
+        except SignatureExpired:
+            return None    # Return if Valid token, but expired
+        except BadSignature:
+            return None    # Return if Invalid token
+        user = detached(User.query.get(data['id']))
+        return user
+
+#Ending the read of an authentication lookup right away, so its connection goes back to the pool before the slow
+#password check (the user is detached from the session and keeps the columns already loaded):
+def detached(user):
+    if user is not None:
+        db.session.expunge(user)
+    db.session.rollback()
+    return user
+
+#Keyset page of one column of the users ordered by id: only that column is read and the page starts right after the
+#id "after" (so the last pages are as fast as the first one). Returns the values and the id of the next page (or None):
+def user_page(column, after=0, limit=1000):
+    columns = [User.id] if column is User.id else [User.id, column]
+    rows = db.session.query(*columns).filter(User.id > after).order_by(User.id).limit(limit).all()
+    db.session.rollback()
+    return [row[-1] for row in rows], (rows[-1][0] if len(rows) == limit else None)
+
+#Creating a Class object "ProvisioningJob" holding the outcome of a bulk provisioning (see provisioning.py):
+class ProvisioningJob(db.Model):
+
+    __tablename__ = 'provisioning_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    state = db.Column(db.String(16), nullable=False) #"queued", "running", "done" or "failed"
+    total = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+    finished_at = db.Column(db.Float)
+    results = db.Column(db.Text) #JSON list of the outcome of every account
+
+#Returning the user matching either authentication method (Username/Password; Token) or "None":
+@metrics.timed('auth')
+def check_credentials(username_or_token, password):
+    #First try to authenticate by token:
+    user = User.verify_auth_token(username_or_token)
+    if not user:
+        #If not try to authenticate with username/password
+        user = detached(User.query.filter_by(username=username_or_token).first())
+        if not user or not user.verify_password(password):
+            return None
+    return user
+
+#Defining a new "verify_password" function which supports both authentication methods (Username/Password; Token):
+@auth.verify_password
+def verify_password(username_or_token, password):
+    user = check_credentials(username_or_token, password)
+    if not user:
+        return False
+    g.user = user
+    return True
+
+#Tuning every new SQLite connection of the user store: in WAL mode the logins keep reading while a registration is
+#written, and a writer waits for the lock instead of failing with "database is locked":
+def tune_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA busy_timeout=15000')
+    if cursor.execute('PRAGMA journal_mode').fetchone()[0] != 'wal': #Switching needs a lock, the mode is kept by the file
+        cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+#Replacing the non-unique index of "username" created by the older versions of the app with the unique one:
+def migrate_username_index(engine):
+    with engine.begin() as conn:
+        indexes = {row[1]: row[2] for row in conn.execute('PRAGMA index_list(users)')}
+        if indexes.get('ix_users_username', 1):
+            return
+        if conn.execute('SELECT username FROM users GROUP BY username HAVING COUNT(*) > 1 LIMIT 1').first():
+            current_app.logger.warning('Duplicated usernames in the users table, keeping the non-unique index')
+            return
+        conn.execute('DROP INDEX ix_users_username')
+        conn.execute('CREATE UNIQUE INDEX ix_users_username ON users (username)')
+
+#Checking that the usernames have a unique index (the bulk provisioning relies on it to skip the registered ones):
+def usernames_are_unique(engine):
+    inspector = inspect(engine)
+    unique = [index['column_names'] for index in inspector.get_indexes('users') if index['unique']]
+    unique += [constraint['column_names'] for constraint in inspector.get_unique_constraints('users')]
+    return ['username'] in unique
+
+#Configuring the user store of the app (called by "create_app"). The connections are tuned before the engine opens
+#the first one, so every connection kept by the pool has the busy timeout, then the missing tables are created (the
+#existing ones are left as they are):
+def init_user_store(app):
+    with app.app_context():
+        sqlite = db.engine.url.drivername == 'sqlite'
+        if sqlite and app.config['USER_DB_WAL']:
+            event.listen(db.engine, 'connect', tune_connection)
+        db.create_all()
+        if sqlite:
+            migrate_username_index(db.engine)
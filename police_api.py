@@ -0,0 +1,247 @@
+#Importing required libraries:
+import codecs
+import contextlib
+import json
+import re
+import time
+import requests
+from flask import current_app
+import crime_stats
+import metrics
+
+
+#Setting the API url (the base url is the "POLICE_API_URL" configuration of the app):
+CRIME_URL_TEMPLATE = '{base}/outcomes-at-location?lat={lat}&lng={lng}&date={data}'
+
+MY_LATITUDE = '51.509865' #The latitude of London City
+MY_LONGITUDE = '-0.118092' #The longitute of London City
+
+#The responses are parsed while they are downloaded, one chunk at a time, and flattened in batches of records:
+STREAM_CHUNK_BYTES = 64 * 1024
+BATCH_RECORDS = 5000
+
+
+#Settings of the calls of an app to the Police API (kept in "app.extensions['police_api']"): the base url, the seconds
+#waiting for a connection or for the next bytes of a response and the circuit breaker ("None" always calls the API):
+class Upstream(object):
+
+    def __init__(self, url, timeout, breaker=None):
+        self.url = url
+        self.timeout = timeout
+        self.breaker = breaker
+
+
+#Settings of the app serving the current request:
+def upstream():
+    return current_app.extensions['police_api']
+
+
+#Error raised when the Police API does not answer with a status_code equal to 200:
+class UpstreamError(Exception):
+
+    def __init__(self, status_code):
+        Exception.__init__(self, 'data.police.uk returned {}'.format(status_code))
+        self.status_code = status_code
+
+
+#Error raised without calling the Police API while the circuit breaker is open (answered with a 503):
+class CircuitOpen(UpstreamError):
+
+    def __init__(self, retry_after):
+        Exception.__init__(self, 'data.police.uk is unavailable, retry in {}s'.format(retry_after))
+        self.status_code = 503
+        self.retry_after = retry_after
+
+
+#Error raised when the Police API cannot be reached (502) or does not answer in time (504):
+def unreachable(timeout):
+    metrics.UPSTREAM_ERRORS.inc('timeout' if timeout else 'connection')
+    return UpstreamError(504 if timeout else 502)
+
+
+#Failing fast while the circuit is open:
+def fast_fail(breaker):
+    metrics.UPSTREAM_FAST_FAILS.inc()
+    return CircuitOpen(breaker.retry_after())
+
+
+#Converting the "date" parameter given by the path (ex. "201811") into the API format (ex. "2018-11"):
+def format_date(date):
+    extract_date = str(date)
+    year = extract_date[0:4] #Slicing date in "year" (ex. "2018")
+    month = extract_date[4:len(extract_date)] #Slicing date in "month" (ex. "11")
+    return year + "-" + month
+
+
+#Calling format on the API string to change {lat}, {lng}, {data} into the above-set paramters:
+def crime_url(date):
+    return CRIME_URL_TEMPLATE.format(
+        base = upstream().url,
+        lat = MY_LATITUDE,
+        lng = MY_LONGITUDE,
+        data = format_date(date))
+
+
+#Checking if the response of a month is in the cache installed by "requests_cache" (so fetching it is cheap):
+def is_cached(date):
+    import requests_cache
+    cache = requests_cache.get_cache()
+    if cache is None:
+        return False
+    if hasattr(cache, 'contains'):
+        return cache.contains(url=crime_url(date))
+    return cache.has_url(crime_url(date)) #requests_cache < 0.6
+
+
+#Whitespace between the records of a response:
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+#Incremental parser of a response (a JSON list of records): the chunks of the body are fed as they arrive, every
+#complete record is decoded with "json" and the records are returned in flattened batches of BATCH_RECORDS, so the
+#whole body and its decoded records are never held in memory at once:
+class RecordParser(object):
+
+    def __init__(self, batch_size=BATCH_RECORDS):
+        self.batch_size = batch_size
+        self.seconds = 0.0
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._text = ''
+        self._state = 'start' #"start" before the "[", "items" inside the list and "end" after the "]"
+        self._records = []
+
+    #Decoding the complete records of the text received so far (the last one may still be incomplete):
+    def _parse(self, chunk, final):
+        started = time.perf_counter()
+        text = self._text + self._utf8.decode(chunk, final)
+        pos, end = 0, len(text)
+        while True:
+            pos = WHITESPACE.match(text, pos).end()
+            if pos == end:
+                break
+            char = text[pos]
+            if self._state == 'start':
+                if char != '[':
+                    raise ValueError('The response is not a list of records')
+                self._state, pos = 'items', pos + 1
+            elif self._state == 'end':
+                raise ValueError('Unexpected data after the list of records')
+            elif char == ']':
+                self._state, pos = 'end', pos + 1
+            elif char == ',':
+                pos += 1
+            else:
+                try:
+                    record, record_end = self._decoder.raw_decode(text, pos)
+                except ValueError:
+                    if final:
+                        raise
+                    break
+                #A number could continue in the next chunk (ex. "6." or "6.5e"):
+                if not final and not isinstance(record, (dict, list)) and (record_end == end or text[record_end] not in ',] \t\n\r'):
+                    break
+                self._records.append(record)
+                pos = record_end
+        if final and self._state != 'end':
+            raise ValueError('The list of records is incomplete')
+        self._text = text[pos:]
+        self.seconds += time.perf_counter() - started
+
+    #Flattening the records decoded so far in batches (only full batches unless the body is complete):
+    def _batches(self, final):
+        batches = []
+        while len(self._records) >= self.batch_size or (final and self._records):
+            batches.append(crime_stats.flatten_records(self._records[:self.batch_size]))
+            del self._records[:self.batch_size]
+        return batches
+
+    #Parsing a chunk of the body, returning the batches of records completed by it:
+    def feed(self, chunk):
+        self._parse(chunk, False)
+        return self._batches(False)
+
+    #Ending the body, returning the last batch (if any) and timing the whole decoding as one "json_decode" stage:
+    def close(self):
+        self._parse(b'', True)
+        metrics.STAGE_SECONDS.observe(self.seconds, metrics.current_route.get(), 'json_decode')
+        return self._batches(True)
+
+
+#Fetching the records of one month with the blocking client, as flattened batches parsed while the body is
+#downloaded (the responses are cached by "requests_cache"). While the circuit is open only a cached response is read:
+def fetch_month_batches(date):
+    settings = upstream()
+    breaker = settings.breaker
+    allowed = breaker is None or breaker.allow()
+    if not allowed and not is_cached(date):
+        raise fast_fail(breaker)
+    outcome = None #Outcome of the call for the breaker ("None" if it was answered by the cache)
+    metrics.UPSTREAM_IN_FLIGHT.inc()
+    try:
+        try:
+            with metrics.stage('upstream'):
+                resp = requests.get(crime_url(date), stream=True, timeout=settings.timeout,
+                                    headers=None if allowed else {'Cache-Control': 'only-if-cached'})
+        except requests.RequestException as e:
+            outcome = False
+            raise unreachable(isinstance(e, requests.Timeout)) from e
+        from_cache = getattr(resp, 'from_cache', False)
+        metrics.cache_lookup('requests_cache', from_cache)
+        with contextlib.closing(resp):
+            if not allowed and resp.status_code != 200: #The cached response has expired
+                raise fast_fail(breaker)
+            if not from_cache:
+                outcome = resp.status_code < 500
+            if resp.status_code != 200:
+                metrics.UPSTREAM_ERRORS.inc(str(resp.status_code))
+                raise UpstreamError(resp.status_code)
+            parser = RecordParser()
+            try:
+                batches = (columns for chunk in resp.iter_content(STREAM_CHUNK_BYTES) for columns in parser.feed(chunk))
+                for columns in metrics.timed_iter('upstream_body', batches):
+                    yield columns
+            except requests.RequestException as e:
+                outcome = False
+                raise unreachable(isinstance(e, requests.Timeout)) from e
+        for columns in parser.close():
+            yield columns
+    finally:
+        metrics.UPSTREAM_IN_FLIGHT.dec()
+        if allowed and breaker is not None:
+            breaker.record(outcome)
+
+
+#Fetching the records of one month with an "httpx.AsyncClient", so waiting on upstream only costs a coroutine:
+async def fetch_month_batches_async(client, date):
+    import httpx
+    breaker = upstream().breaker
+    allowed = breaker is None or breaker.allow()
+    if not allowed:
+        raise fast_fail(breaker)
+    outcome = None
+    metrics.UPSTREAM_IN_FLIGHT.inc()
+    try:
+        try:
+            with metrics.stage('upstream'):
+                resp = await client.send(client.build_request('GET', crime_url(date)), stream=True)
+            try:
+                outcome = resp.status_code < 500
+                if resp.status_code != 200:
+                    metrics.UPSTREAM_ERRORS.inc(str(resp.status_code))
+                    raise UpstreamError(resp.status_code)
+                parser = RecordParser()
+                batches = (columns async for chunk in resp.aiter_bytes(STREAM_CHUNK_BYTES) for columns in parser.feed(chunk))
+                async for columns in metrics.timed_aiter('upstream_body', batches):
+                    yield columns
+            finally:
+                await resp.aclose()
+        except httpx.TransportError as e:
+            outcome = False
+            raise unreachable(isinstance(e, httpx.TimeoutException)) from e
+        for columns in parser.close():
+            yield columns
+    finally:
+        metrics.UPSTREAM_IN_FLIGHT.dec()
+        if breaker is not None:
+            breaker.record(outcome)
@@ -0,0 +1,155 @@
+#Importing required libraries:
+import cProfile
+import contextvars
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+
+
+#Opt-in profiling of single requests under "cProfile" and "tracemalloc".
+#Each profiled request leaves three artifacts in PROFILE_DIR:
+#    <id>.prof  the call stats, to be opened with pstats (or snakeviz)
+#    <id>.txt   the slowest functions (by cumulative time) and the top allocation sites
+#    <id>.json  the metadata listed by the admin endpoint
+
+PROFILE_DIR = 'profiles'
+
+#Amount of profiles kept on disk (the oldest are deleted first):
+PROFILE_KEEP = 100
+
+#Frames kept for each allocation traced by "tracemalloc":
+TRACE_FRAMES = 10
+
+PROFILE_KINDS = {'prof': 'application/octet-stream', 'txt': 'text/plain', 'json': 'application/json'}
+PROFILE_ID = re.compile(r'^[0-9]{14}-[0-9a-f]{8}$')
+
+#"tracemalloc" is global to the process, so only one request is profiled at a time:
+_busy = threading.Lock()
+
+#Session of the request being profiled, copied with the context of the request into the threads running its work
+#(see "batch.submit"):
+current = contextvars.ContextVar('profile_session', default=None)
+
+
+#A request being profiled. "cProfile" follows a single thread, so the calls made for the request by other threads
+#get a profiler of their own, merged into the stats of the request once they return:
+class Session(object):
+
+    def __init__(self):
+        self.id = '{}-{}'.format(time.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex[:8])
+        self.profiler = cProfile.Profile()
+        self.thread_profilers = []
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        self.profiler.enable()
+
+    #Profiling a call made for the request by another thread (ex. a month loaded by "/api/batch"):
+    def run_in_thread(self, function, *args):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError: #Python 3.12+: the profiler of the request already follows every thread
+            return function(*args)
+        try:
+            return function(*args)
+        finally:
+            profiler.disable()
+            with self.lock:
+                self.thread_profilers.append(profiler)
+
+    #Stopping the profilers and writing the artifacts of the request (the calls of other threads still running are
+    #not included):
+    def finish(self, meta):
+        self.profiler.disable()
+        duration = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if self.started_tracing:
+            tracemalloc.stop()
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        report = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=report)
+        with self.lock:
+            for profiler in self.thread_profilers:
+                stats.add(profiler)
+        stats.dump_stats(base + '.prof')
+
+        report.write('{} {} ({:.1f} ms, peak {:.1f} MB)\n\n'.format(meta.get('method'), meta.get('path'), duration * 1000, peak / 1e6))
+        stats.sort_stats('cumulative').print_stats(40)
+        report.write('\nTop allocation sites:\n')
+        for stat in snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).statistics('lineno')[:25]:
+            report.write('{}\n'.format(stat))
+        with open(base + '.txt', 'w') as f:
+            f.write(report.getvalue())
+
+        meta = dict(meta, id=self.id, created=time.time(), duration=duration, peak_bytes=peak)
+        with open(base + '.json', 'w') as f:
+            json.dump(meta, f)
+        _prune()
+        return meta
+
+
+#Starting to profile the current request, unless another request is already being profiled:
+def start():
+    if not _busy.acquire(False):
+        return None
+    try:
+        session = Session()
+    except Exception:
+        _busy.release()
+        raise
+    current.set(session)
+    return session
+
+
+#Finishing a profile started by "start":
+def finish(session, meta):
+    try:
+        return session.finish(meta)
+    finally:
+        current.set(None)
+        _busy.release()
+
+
+#Deleting the oldest profiles:
+def _prune():
+    profiles = list_profiles()
+    for meta in profiles[PROFILE_KEEP:]:
+        for kind in PROFILE_KINDS:
+            path = profile_path(meta['id'], kind)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+#Listing the metadata of the stored profiles, newest first:
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(PROFILE_DIR, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return sorted(profiles, key=lambda meta: meta['id'], reverse=True)
+
+
+#Returning the path of an artifact, or "None" if the id or the kind is not valid:
+def profile_path(profile_id, kind):
+    if not PROFILE_ID.match(profile_id) or kind not in PROFILE_KINDS:
+        return None
+    return os.path.join(PROFILE_DIR, '{}.{}'.format(profile_id, kind))
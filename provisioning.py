@@ -0,0 +1,186 @@
+#Importing required libraries:
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from passlib.apps import custom_app_context as pwd_context
+from extensions import db
+from models import User, ProvisioningJob, usernames_are_unique
+
+
+#Bulk provisioning of users. The passwords are hashed by a pool of processes using every core, then all the accounts
+#are inserted in one transaction. Each account gets its own outcome:
+#    "created"    the user was inserted (with its "id")
+#    "exists"     the username was already registered
+#    "duplicate"  the username appears more than once in the list (only the first one is provisioned)
+#    "invalid"    the username or the password is missing, not a string, or the username is too long
+
+#Maximum amount of accounts of a single provisioning:
+MAX_BULK_USERS = 10000
+
+#Processes hashing the passwords (created on first use, "BULK_HASH_PROCESSES" of them). They are spawned rather than
+#forked, as forking a worker running other threads could copy a lock held by one of them into the children:
+_pool = None
+_pool_lock = threading.Lock()
+
+
+#Hashing one password (runs in the processes of the pool):
+def hash_password(password):
+    return pwd_context.encrypt(password)
+
+
+#Hashing a list of passwords across the processes of the pool:
+def hash_passwords(passwords):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=current_app.config['BULK_HASH_PROCESSES'] or os.cpu_count(),
+                                        mp_context=multiprocessing.get_context('spawn'))
+    workers = _pool._max_workers
+    return list(_pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+#Validating the list of accounts (ex. [{"username": "TEST", "password": "123"}]), raising ValueError if it is not a list:
+def parse_users(users):
+    if not isinstance(users, list) or not users:
+        raise ValueError('The body must contain a non-empty "users" list')
+    if len(users) > MAX_BULK_USERS:
+        raise ValueError('A provisioning accepts at most {} users'.format(MAX_BULK_USERS))
+    return users
+
+
+#Refusing to provision without the unique index on the usernames: "OR IGNORE" would insert the registered ones again
+#(see "migrate_username_index" in models.py):
+def require_unique_usernames():
+    if not usernames_are_unique(db.engine):
+        raise RuntimeError('The users table has no unique index on the usernames, remove the duplicated usernames '
+                           'and restart the app to create it')
+
+
+#Provisioning the accounts, returning the outcome of each one in the order of the list:
+def provision(users):
+    require_unique_usernames()
+    results, pending, seen = [], [], set()
+    username_length = User.__table__.c.username.type.length
+    for entry in users:
+        username = entry.get('username') if isinstance(entry, dict) else None
+        password = entry.get('password') if isinstance(entry, dict) else None
+        if not isinstance(username, str) or not isinstance(password, str) or not username or len(username) > username_length:
+            results.append({'username': username if isinstance(username, str) else None, 'status': 'invalid'})
+        elif username in seen:
+            results.append({'username': username, 'status': 'duplicate'})
+        else:
+            seen.add(username)
+            results.append({'username': username, 'status': None})
+            pending.append((len(results) - 1, username, password))
+    if not pending:
+        return results
+
+    hashes = hash_passwords([password for _, _, password in pending])
+
+    #"OR IGNORE" skips the usernames that are already registered (even by a concurrent request), then the accounts
+    #holding the hash just computed are the ones this provisioning created:
+    rows = [{'username': username, 'password_hash': password_hash} for (_, username, _), password_hash in zip(pending, hashes)]
+    usernames = [row['username'] for row in rows]
+    stored = {}
+    try:
+        db.session.execute(User.__table__.insert().prefix_with('OR IGNORE'), rows)
+        for start in range(0, len(usernames), 500):
+            query = db.session.query(User.username, User.id, User.password_hash).filter(User.username.in_(usernames[start:start + 500]))
+            stored.update((username, (user_id, password_hash)) for username, user_id, password_hash in query)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for (index, username, _), password_hash in zip(pending, hashes):
+        user_id, stored_hash = stored.get(username, (None, None))
+        if stored_hash == password_hash:
+            results[index] = {'username': username, 'status': 'created', 'id': user_id}
+        else:
+            results[index] = {'username': username, 'status': 'exists'}
+    return results
+
+
+#Counting the outcomes of a provisioning:
+def summary(results):
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return counts
+
+
+#Running a provisioning job in a background thread, so the request threads of the worker are not blocked. Whatever
+#happens to the provisioning, the job ends "done" or "failed":
+def run_job(app, job_id, users):
+    with app.app_context():
+        results, state = None, 'failed'
+        try:
+            job = ProvisioningJob.query.get(job_id)
+            job.state = 'running'
+            db.session.commit()
+            results = provision(users)
+            state = 'done'
+        except Exception:
+            app.logger.exception('Provisioning job %s failed', job_id)
+            db.session.rollback()
+        finally:
+            job = ProvisioningJob.query.get(job_id)
+            job.state, job.finished_at = state, time.time()
+            job.results = None if results is None else json.dumps(results)
+            db.session.commit()
+
+
+#Failing the jobs still "queued" or "running" after "timeout" seconds: the worker running them died (ex. restarted
+#or killed) and they will never finish:
+def fail_stale_jobs(timeout):
+    now = time.time()
+    ProvisioningJob.query.filter(ProvisioningJob.state.in_(('queued', 'running')),
+                                 ProvisioningJob.created_at < now - timeout).update(
+        {'state': 'failed', 'finished_at': now}, synchronize_session=False)
+    db.session.commit()
+
+
+#Recording a new job and starting it, returning its id:
+def start_job(app, users):
+    require_unique_usernames()
+    job_id = uuid.uuid4().hex
+    db.session.add(ProvisioningJob(id=job_id, state='queued', total=len(users), created_at=time.time()))
+    db.session.commit()
+    threading.Thread(target=run_job, args=(app, job_id, users), name='provisioning-' + job_id, daemon=True).start()
+    return job_id
+
+
+#Status of a job as returned by the status endpoint:
+def job_status(job):
+    results = json.loads(job.results) if job.results else None
+    return {'job': job.id, 'state': job.state, 'total': job.total, 'created_at': job.created_at,
+            'finished_at': job.finished_at, 'summary': summary(results) if results is not None else None,
+            'results': results}
+
+
+#Command provisioning the accounts of a JSON file ([{"username": ..., "password": ...}]) or a CSV file (username,password):
+@click.command('provision-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def provision_users_command(path):
+    with open(path) as f:
+        if path.endswith('.csv'):
+            import csv
+            users = [{'username': row[0], 'password': row[1]} for row in csv.reader(f) if len(row) >= 2]
+        else:
+            users = json.load(f)
+    try:
+        users = parse_users(users)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    started = time.perf_counter()
+    results = provision(users)
+    for result in results:
+        click.echo('{}\t{}'.format(result['status'], result['username']))
+    click.echo('{} users in {:.1f}s: {}'.format(len(results), time.perf_counter() - started, json.dumps(summary(results), sort_keys=True)))
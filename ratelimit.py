@@ -0,0 +1,125 @@
+#Importing required libraries:
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+try:
+    import fcntl
+except ImportError: #Windows: the buckets are only shared by the threads of one worker
+    fcntl = None
+
+
+#Token buckets limiting how much each user (and all the users together) can ask of the Police API and Plotly.
+#A request served from the caches costs CHEAP_COST tokens of the bucket of its user. Every month that has to be
+#fetched from the Police API and every figure plotted on Plotly also cost UPSTREAM_COST and PLOT_COST tokens of
+#both the bucket of the user and the global bucket, which protects the share of the whole app.
+#The buckets live in a small memory-mapped file, so every worker process of the machine shares them. The file is
+#a table of SLOTS records "(key, tokens, updated)"; the first one is the global bucket.
+
+CHEAP_COST = 1
+UPSTREAM_COST = 10
+PLOT_COST = 25
+
+SLOTS = 4096
+PROBES = 16
+RECORD = struct.Struct('<Qdd')
+
+
+#Outcome of a request: the headers reporting the bucket of the user and, if rejected, when to retry:
+class Decision(object):
+
+    def __init__(self, allowed, limit, remaining, retry_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+    def headers(self):
+        headers = {'X-RateLimit-Limit': str(self.limit), 'X-RateLimit-Remaining': str(self.remaining)}
+        if not self.allowed:
+            headers['Retry-After'] = str(self.retry_after)
+        return headers
+
+
+#Cost of a request for the bucket of the user and for the global bucket:
+def request_cost(upstream_months=0, plots=0):
+    shared = upstream_months * UPSTREAM_COST + plots * PLOT_COST
+    return CHEAP_COST + shared, shared
+
+
+#Slot key of a user (0 marks an empty slot):
+def _key(user):
+    return int.from_bytes(hashlib.blake2b(str(user).encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+class RateLimiter(object):
+
+    def __init__(self, path, user_capacity, user_rate, global_capacity, global_rate):
+        self.path = path
+        self.user_capacity, self.user_rate = user_capacity, user_rate
+        self.global_capacity, self.global_rate = global_capacity, global_rate
+        self._lock = threading.Lock()
+        self._map = None
+
+    #Opening (once per process) the file of the buckets:
+    def _open(self):
+        if self._map is None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < SLOTS * RECORD.size:
+                os.ftruncate(fd, SLOTS * RECORD.size)
+            self._fd, self._map = fd, mmap.mmap(fd, SLOTS * RECORD.size)
+        return self._map
+
+    #Finding the slot of a user, or the least recently used slot of its probes if it has none:
+    def _slot(self, buckets, key):
+        start = 1 + key % (SLOTS - 1)
+        oldest = None
+        for i in range(PROBES):
+            slot = 1 + (start - 1 + i) % (SLOTS - 1)
+            slot_key, _, updated = RECORD.unpack_from(buckets, slot * RECORD.size)
+            if slot_key == key or slot_key == 0:
+                return slot, slot_key == key
+            if oldest is None or updated < oldest[1]:
+                oldest = (slot, updated)
+        return oldest[0], False
+
+    #Tokens of a bucket after refilling it since its last update (a new bucket starts full):
+    @staticmethod
+    def _refill(buckets, slot, found, capacity, rate, now):
+        if not found:
+            return float(capacity)
+        _, tokens, updated = RECORD.unpack_from(buckets, slot * RECORD.size)
+        return min(float(capacity), tokens + max(0.0, now - updated) * rate)
+
+    #Taking the tokens of a request from the bucket of the user and from the global bucket, if both have enough.
+    #A request costing more than a bucket holds is accepted once the bucket is full:
+    def consume(self, user, cost, shared_cost=0):
+        cost, shared_cost = min(cost, self.user_capacity), min(shared_cost, self.global_capacity)
+        key = _key(user)
+        with self._lock:
+            buckets = self._open()
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                slot, found = self._slot(buckets, key)
+                tokens = self._refill(buckets, slot, found, self.user_capacity, self.user_rate, now)
+                global_tokens = self._refill(buckets, 0, RECORD.unpack_from(buckets, 0)[0] != 0,
+                                             self.global_capacity, self.global_rate, now)
+                allowed = tokens >= cost and global_tokens >= shared_cost
+                if allowed:
+                    tokens -= cost
+                    global_tokens -= shared_cost
+                RECORD.pack_into(buckets, slot * RECORD.size, key, tokens, now)
+                RECORD.pack_into(buckets, 0, 1, global_tokens, now)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        #Seconds until both buckets hold enough tokens again:
+        wait = max((cost - tokens) / self.user_rate if self.user_rate else 0.0,
+                   (shared_cost - global_tokens) / self.global_rate if self.global_rate else 0.0)
+        return Decision(allowed, self.user_capacity, int(tokens), 0 if allowed else max(1, int(math.ceil(wait))))
@@ -0,0 +1,583 @@
+#Importing required libraries:
+from flask import Blueprint, current_app, request, g, abort, Response, send_file, stream_with_context
+from flask import jsonify as flask_jsonify
+from sqlalchemy.exc import IntegrityError
+import functools
+import json
+import os
+import random
+import time
+from extensions import db, auth
+from models import User, ProvisioningJob, user_page
+import police_api
+import crime_stats
+import charts
+import compact
+import batch
+import streaming
+import store
+import metrics
+import profiling
+import admission
+import ratelimit
+import provisioning
+import circuit
+
+
+#Every route of the app (registered by "create_app" in app.py):
+api = Blueprint('api', __name__)
+
+
+#Timing the "jsonify" stage of every response:
+def jsonify(*args, **kwargs):
+    with metrics.stage('jsonify'):
+        return flask_jsonify(*args, **kwargs)
+
+@api.route('/api/users', methods=['POST']) #The "/api/users" Path calls the function
+def new_user():
+    username = request.json.get('username') #Extracting the username from the Json request
+    password = request.json.get('password') #Extracting the password from the Json request
+    if username is None or password is None:
+        abort(400)    # Abort request if any missing arguments
+    if User.query.filter_by(username=username).first() is not None:
+        abort(400)    # Abort request if it is an extisting user
+        
+    #If the arguments are valid then a new User instance is created:
+    user = User(username=username) #Assign username
+    user.hash_password(password) #Hash the password using the hash_password()
+    
+    #The user is finally written to the database (the unique username fails the insert of a concurrent registration):
+    db.session.add(user) 
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        abort(400)    # Abort request if the user was registered in the meantime
+    
+    #Return the succesful request:
+    return (jsonify({'username': user.username}), 201)
+
+
+@api.route('/api/users/bulk/<secret_key>', methods=['POST'])
+def bulk_users(secret_key): #"bulk_users" provisions a list of users in the background and returns the id of the job.
+    
+    #Secret key is a paramter just known to the admin:
+    if secret_key == current_app.config['SECRET_KEY']:
+        #Abort request if the list of users is not valid:
+        body = request.get_json(silent=True)
+        try:
+            users = provisioning.parse_users(body.get('users') if isinstance(body, dict) else None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        #The passwords are hashed and the users inserted by a background job:
+        job_id = provisioning.start_job(current_app._get_current_object(), users)
+        return jsonify({'job': job_id, 'state': 'queued', 'total': len(users)}), 202
+    
+    #Else return a suggestion:
+    else:
+        return "Your secret_key parameter is wrong"
+
+
+@api.route('/api/users/bulk/<job_id>/<secret_key>', methods=['GET'])
+def get_bulk_job(job_id, secret_key): #"get_bulk_job" returns the state of a provisioning job and the outcome of every user.
+    
+    #Secret key is a paramter just known to the admin:
+    if secret_key == current_app.config['SECRET_KEY']:
+        provisioning.fail_stale_jobs(current_app.config['BULK_JOB_TIMEOUT_SECONDS'])
+        job = ProvisioningJob.query.get(job_id)
+        if not job:
+            abort(404)
+        return jsonify(provisioning.job_status(job))
+    
+    #Else return a suggestion:
+    else:
+        return "Your secret_key parameter is wrong"
+
+
+@api.route('/api/users/<int:id>/<secret_key>', methods=['GET'])
+def get_user(id, secret_key): #get_user" has one paramter
+    
+    #Secret key is a paramter just known to the admin:
+    if secret_key == current_app.config['SECRET_KEY']:
+        #Querying the user for the given id:
+        user = User.query.get(id)
+
+       #If the id is not in the user table abort the request:
+        if not user:
+            abort(400)
+
+        #If the id is in user table then return the username for the given userid
+        return jsonify({'username': user.username})
+    
+    #Else return a suggestion:
+    else:
+        return "Your secret_key parameter is wrong"
+
+
+#Listing one column of the users: a page of "?limit=" values after the id "?after=" (the id to ask for the next page
+#is returned in the "X-Next-After" header), or every value streamed as one JSON document per line with "?format=ndjson":
+def list_users(column):
+    try:
+        after = int(request.args.get('after', 0))
+        limit = int(request.args.get('limit', current_app.config['USER_LIST_LIMIT']))
+    except ValueError:
+        return jsonify({'error': 'The after and limit parameters must be integers'}), 400
+    if not 1 <= limit <= current_app.config['USER_LIST_MAX_LIMIT']:
+        return jsonify({'error': 'The limit must be between 1 and {}'.format(current_app.config['USER_LIST_MAX_LIMIT'])}), 400
+
+    #The dump reads one page at a time, so its memory does not grow with the amount of users:
+    if request.args.get('format') == 'ndjson':
+        def dump(after):
+            while after is not None:
+                values, after = user_page(column, after, limit)
+                if values:
+                    yield ''.join(json.dumps(value) + '\n' for value in values)
+        return Response(stream_with_context(dump(after)), mimetype='application/x-ndjson')
+
+    values, next_after = user_page(column, after, limit)
+    response = jsonify(values)
+    if next_after is not None:
+        response.headers['X-Next-After'] = str(next_after)
+    return response
+
+
+@api.route('/api/all_users_names/<secret_key>', methods=['GET'])
+def get_all_usernames(secret_key): #"get_all_usernamers" has one paramter "secret_key"
+    
+    #Secret key is a paramter just known to the admin:
+    if secret_key == current_app.config['SECRET_KEY']:
+        #If the admin is authenticated then query a page of the usernames (without loading the users):
+        return list_users(User.username)
+    
+    #Else return a suggestion:
+    else:
+        return "Your secret_key parameter is wrong"
+
+@api.route('/api/all_users_ids/<secret_key>', methods=['GET'])
+def get_all_userids(secret_key): #"get_all_userids" has one paramter "secret_key"
+    
+    #Secret key is a paramter just known to the admin:
+    if secret_key == current_app.config['SECRET_KEY']:
+        #If the admin is authenticated then query a page of the ids (without loading the users):
+        return list_users(User.id)
+    
+    #Else return a suggestion:
+    else:
+        return "Your secret_key parameter is wrong"
+
+
+@api.route('/api/token')
+@auth.login_required #To generate the token a the user needs to authenticate himself:
+def get_auth_token():
+    token = g.user.generate_auth_token(600) #Generate the token
+    return jsonify({'token': token.decode('ascii'), 'duration': 600}) #Return the token with a duration of 600 seconds
+
+#Fetching the flattened records of one month from the Police API (the month is ingested in the store the first time).
+#The batches are flattened, sketched and appended to the compact columns of the month while the response is still arriving:
+def fetch_columns(date):
+    month = police_api.format_date(date)
+    ingest = None if store.is_ingested(month) else store.MonthIngest(month)
+    columns = compact.CompactMonth()
+    for records in police_api.fetch_month_batches(date):
+        columns.extend(records)
+        if ingest is not None:
+            ingest.add(records)
+    columns.seal()
+    if ingest is not None:
+        ingest.finish(columns)
+    return columns
+
+#Loading the flattened records of one month, from the store if the Police API is unhealthy (the response is then flagged as stale):
+def load_columns(date):
+    try:
+        return fetch_columns(date)
+    except police_api.UpstreamError as e:
+        return circuit.stale_columns(date, e)
+
+#Count series of the months served recently, kept for as long as "requests_cache" keeps their responses (a month
+#served from the store while the Police API is unhealthy is not kept). They are forgotten when a snapshot replaces
+#the store:
+SERIES_EXPIRE = 36000
+SERIES_MONTHS = 64
+_series = store.GenerationCache(SERIES_MONTHS)
+
+#Loading the count series of one month, read by both the count endpoints and the graphs (see crime_stats.CountSeries):
+def load_series(date):
+    month = police_api.format_date(date)
+    series = _series.get(month)
+    metrics.cache_lookup('series', series is not None)
+    if series is not None:
+        return series
+    series = crime_stats.month_series(load_columns(date))
+    if month not in (circuit.stale_months.get() or {}):
+        _series.put(month, series, SERIES_EXPIRE)
+    return series
+
+#Ingesting the months of a range that are not in the store yet, returning the months and the ones that failed:
+def ingest_range(dates):
+    missing = [date for date in dates if not store.is_ingested(police_api.format_date(date))]
+    resolved = batch.map_in_context(lambda date: batch.resolve(load_columns, date), missing)
+    failed = [police_api.format_date(date) for date, columns in zip(missing, resolved) if isinstance(columns, police_api.UpstreamError)]
+    return [police_api.format_date(date) for date in dates], failed
+
+#Counting the months of a request that would have to be fetched from the Police API:
+def upstream_months(dates):
+    return sum(1 for date in dates if not police_api.is_cached(date))
+
+#Costs of the data requests for the rate limits (see ratelimit.py), computed from the arguments of the views:
+def month_cost(date, **kwargs):
+    return ratelimit.request_cost(upstream_months([date]))
+
+def graph_cost(date, **kwargs):
+    return ratelimit.request_cost(upstream_months([date]), plots=1)
+
+def range_cost(start_date, end_date, **kwargs):
+    try:
+        return ratelimit.request_cost(upstream_months(streaming.month_range(start_date, end_date)))
+    except ValueError:
+        return ratelimit.request_cost()
+
+def ingest_cost(start_date, end_date, **kwargs):
+    try:
+        dates = streaming.month_range(start_date, end_date)
+    except ValueError:
+        return ratelimit.request_cost()
+    return ratelimit.request_cost(upstream_months([date for date in dates if not store.is_ingested(police_api.format_date(date))]))
+
+def batch_cost(**kwargs):
+    try:
+        return ratelimit.request_cost(upstream_months(batch.distinct_dates(batch.parse_queries(request.get_json(silent=True)))))
+    except ValueError:
+        return ratelimit.request_cost()
+
+#Decorator taking the cost of the request from the buckets of the user (or of its address if the route is not authenticated).
+#The decision is kept in "g", so its headers are added to every response of the request, errors included:
+def rate_limited(cost):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions['ratelimit']
+            if limiter is None:
+                return view(*args, **kwargs)
+            user = g.user.id if 'user' in g else request.remote_addr
+            g.rate_limit = limiter.consume(user, *cost(**kwargs))
+            if not g.rate_limit.allowed:
+                return jsonify({'error': 'Rate limit exceeded'}), 429
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+#Name of the view serving the request without the name of the blueprint (ex. "get_records"), used as the route of the metrics:
+def route_name():
+    return (request.endpoint or 'none').rpartition('.')[2]
+
+#Labelling the metrics of the request with its route and starting its timer:
+@api.before_app_request
+def start_request_timer():
+    metrics.current_route.set(route_name())
+    circuit.stale_months.set({})
+    g.request_started = time.perf_counter()
+
+#Recording the duration of every request:
+@api.after_app_request
+def observe_request(response):
+    if 'request_started' in g:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, route_name(), response.status_code)
+    return response
+
+#Adding the headers of the rate limits to the response (see "rate_limited"):
+@api.after_app_request
+def rate_limit_headers(response):
+    if 'rate_limit' in g:
+        response.headers.extend(g.rate_limit.headers())
+    return response
+
+#Flagging the responses holding months served from the store while the Police API was unhealthy:
+@api.after_app_request
+def flag_stale(response):
+    response.headers.extend(circuit.staleness_headers(circuit.stale_months.get()))
+    return response
+
+#Profiling the request when the admin asks for it ("X-Profile: <secret_key>") or when it is sampled:
+@api.before_app_request
+def start_profile():
+    if route_name() in ('list_profiles', 'get_profile'):
+        return
+    if request.headers.get('X-Profile') == current_app.config['SECRET_KEY'] or random.random() < current_app.config['PROFILE_SAMPLE_RATE']:
+        g.profile = profiling.start() #"None" if another request is already being profiled
+
+#Writing the artifacts of the profiled request and returning their id (a streamed response is profiled until its
+#body has been sent):
+@api.after_app_request
+def finish_profile(response):
+    session = g.pop('profile', None)
+    if session is not None:
+        meta = {'route': route_name(), 'method': request.method, 'path': request.path, 'status': response.status_code}
+        response.headers['X-Profile-Id'] = session.id
+        if response.is_streamed:
+            response.call_on_close(lambda: profiling.finish(session, meta))
+        else:
+            profiling.finish(session, meta)
+    return response
+
+#Releasing the profiler if the request failed before "after_request":
+@api.teardown_app_request
+def release_profile(exc):
+    session = g.pop('profile', None)
+    if session is not None:
+        profiling.finish(session, {'route': route_name(), 'method': request.method, 'path': request.path, 'status': 500})
+
+#Calling "errorhandler" to receive an error message if the request returns 404:
+@api.app_errorhandler(404)
+def page_not_found(e):
+    return  "There has been an error", 404
+
+#Calling "errorhandler" to return the "status_code" of the Police API when it does not answer with a 200 (a 503 with
+#"Retry-After" while the circuit breaker is open):
+@api.app_errorhandler(police_api.UpstreamError)
+def upstream_error(e):
+    if isinstance(e, police_api.CircuitOpen):
+        return "There has been an error", e.status_code, {'Retry-After': str(e.retry_after)}
+    return "There has been an error", e.status_code
+
+#Calling "errorhandler" to answer with a 429 when a heavy request does not fit in the memory budgets:
+@api.app_errorhandler(admission.Rejected)
+def too_many_requests(e):
+    return jsonify({'error': str(e)}), 429, {'Retry-After': str(e.retry_after)}
+
+
+@api.route('/api/all_crime_data/<date>/<n_records>/<csv>', methods = ['GET'])#The "/all_crime_data/<date>/<n_records>" Path calls the function
+@auth.login_required
+@rate_limited(month_cost)
+def get_records(date, n_records, csv): #"get_records" has 3 parameters:
+                                      #1. "date" parameter
+                                      #2. "n_records" paramter, which can be either All or an interger
+                                      #3. "csv" is given to allow the user to extract a csv
+    #Waiting for the memory the records need (estimated from the size of the month):
+    with current_app.extensions['admission'].admit(g.user.id, admission.records_cost(date, n_records)):
+        columns = load_columns(date)
+        result = crime_stats.select_records(columns, police_api.format_date(date), n_records, csv)
+
+        #Messages are returned as they are, records in a json format:
+        if isinstance(result, str):
+            return result
+        return jsonify(result)
+
+
+@api.route('/api/code_count/<date>', methods = ['GET']) # The "/code_count/<date>" Path calls the function
+@rate_limited(month_cost)
+def get_code(date):#"get_code" has only one paramter ("date") which is given in the path.
+    
+    #Return the condensed count of the ["Crime code"] in json format:
+    return jsonify(load_series(date)["codes"].table("consequence"))
+
+
+@api.route('/api/code_count/graph/<date>', methods = ['GET']) # The "/code_count/graph/<date>" Path calls the function
+@auth.login_required
+@rate_limited(graph_cost)
+def get_code_graph(date):#"get_code_graph" has only one paramter ("date") which is given in the path.
+    
+    fig = charts.count_figure(load_series(date)["codes"], "Consequences", police_api.format_date(date))
+
+    #Return the link of the figure and send the app user directly to the webpage which is hosting the Graphs:
+    return jsonify(charts.plot_figure(fig, current_app.config['MY_API_KEY'], current_app.config['PLOTLY_OFFLINE']))
+
+
+@api.route('/api/location_count/<date>', methods = ['GET']) #The "/location_count/<date>" Path calls the function
+@auth.login_required
+@rate_limited(month_cost)
+def get_loc(date): #"get_loc" has only one paramter ("date") which is given in the path.
+    
+    #Return the condensed count of the ["Sub_location"] in json format:
+    return jsonify(load_series(date)["location_subtypes"].table("location"))
+
+
+@api.route('/api/location_count/graph/<date>', methods = ['GET']) #/location_count/graph/<date>" Path calls the function
+@auth.login_required
+@rate_limited(graph_cost)
+def get_loc_graph(date): #"get_loc_graph" has only one paramter ("date") which is given in the path.
+    
+    fig = charts.count_figure(load_series(date)["location_subtypes"], "Sub_Location", police_api.format_date(date))
+
+    #Return the link of the figure and send the app user directly to the webpage which is hosting the Graphs:
+    return jsonify(charts.plot_figure(fig, current_app.config['MY_API_KEY'], current_app.config['PLOTLY_OFFLINE']))
+
+
+@api.route('/api/crime_count/<date>', methods = ['GET']) #/crime_count/<date>" Path calls the function
+@auth.login_required
+@rate_limited(month_cost)
+def get_crime(date): #"get_crime" has only one paramter ("date") which is given in the path.
+    
+    #Return the condensed count of the ["Crime_Description"] in json format:
+    return jsonify(load_series(date)["crime_categories"].table("crime"))
+
+
+@api.route('/api/crime_count/graph/<date>', methods = ['GET']) #/crime_count/graph/<date>" Path calls the function
+@auth.login_required
+@rate_limited(graph_cost)
+def get_crime_graph(date): #"get_crime_graph" has only one paramter ("date") which is given in the path.
+    
+    fig = charts.count_figure(load_series(date)["crime_categories"], "Category", police_api.format_date(date))
+
+    #Return the link of the figure and send the app user directly to the webpage which is hosting the Graphs:
+    return jsonify(charts.plot_figure(fig, current_app.config['MY_API_KEY'], current_app.config['PLOTLY_OFFLINE']))
+    
+
+@api.route('/api/all_graphs/<date>', methods = ['GET']) #"/all_graphs/<date>" Path calls the function
+@auth.login_required
+@rate_limited(graph_cost)
+def get_graphs(date): #"get_graphs" has only one paramter ("date") which is given in the path.
+    
+    fig = charts.all_stats_figure(load_series(date), police_api.format_date(date))
+
+    #Return the link of the figure and send the app user directly to the webpage which is hosting the Graphs:
+    return jsonify(charts.plot_figure(fig, current_app.config['MY_API_KEY'], current_app.config['PLOTLY_OFFLINE']))
+
+
+@api.route('/api/batch', methods = ['POST']) #"/api/batch" Path calls the function
+@auth.login_required
+@rate_limited(batch_cost)
+def batch_queries(): #"batch_queries" runs a list of sub-queries against one shared snapshot of each month.
+    
+    #Abort request if the list of sub-queries is not valid:
+    try:
+        queries = batch.parse_queries(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    #Return the results of every sub-query in json format, once the records they ask for fit in the memory budgets:
+    with current_app.extensions['admission'].admit(g.user.id, admission.batch_cost(queries)):
+        return jsonify(batch.run_batch(queries, load_columns))
+
+
+@api.route('/api/stream/<endpoint>/<start_date>/<end_date>', methods = ['GET']) #"/api/stream/<endpoint>/<start_date>/<end_date>" Path calls the function
+@auth.login_required
+@rate_limited(range_cost)
+def stream_months(endpoint, start_date, end_date): #"stream_months" streams one of the data endpoints over a range of months.
+    
+    #Abort request if the endpoint or the range of months is not valid:
+    if endpoint not in streaming.STREAM_ENDPOINTS:
+        abort(404)
+    try:
+        dates = streaming.month_range(start_date, end_date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    #Streams of records keep their memory budget until the response is closed:
+    release = None
+    if endpoint == "all_crime_data":
+        release = current_app.extensions['admission'].hold(g.user.id, admission.stream_cost(dates, streaming.PREFETCH_MONTHS))
+
+    #Return each month's result as a Server-Sent Event as soon as it is ready:
+    response = Response(stream_with_context(streaming.stream_job(endpoint, dates, load_columns)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    if release is not None:
+        response.call_on_close(release)
+    return response
+
+
+@api.route('/api/top/<field>/<start_date>/<end_date>', methods = ['GET']) #"/api/top/<field>/<start_date>/<end_date>" Path calls the function
+@auth.login_required
+@rate_limited(ingest_cost)
+def get_top(field, start_date, end_date): #"get_top" ranks the "streets" or "locations" with the most crimes over a range of months.
+    
+    #Abort request if the field or the range of months is not valid:
+    if field not in store.SKETCHED_COLUMNS:
+        abort(404)
+    try:
+        dates = streaming.month_range(start_date, end_date)
+        k = int(request.args.get('k', 10))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    #Merging the sketches of every month:
+    months, failed = ingest_range(dates)
+    sketch = store.merged_sketch(field, [month for month in months if month not in failed])
+
+    #Return the ranking in json format, "min_count" is a lower bound of the true count and "count" an upper bound:
+    return jsonify({'months': months, 'failed': failed, 'total': sketch.total, 'error_bound': sketch.floor,
+                    'top': [{'name': name, 'count': count, 'min_count': count - error} for name, count, error in sketch.top(k)]})
+
+
+@api.route('/api/query/<start_date>/<end_date>', methods = ['GET']) #"/api/query/<start_date>/<end_date>" Path calls the function
+@auth.login_required
+@rate_limited(ingest_cost)
+def get_query(start_date, end_date): #"get_query" filters, groups and sorts the stored records of a range of months.
+    
+    #Abort request if the range of months or the parameters are not valid (the months that fail have no stored records):
+    filters = {field: request.args.getlist(field) for field in request.args if field not in ('group_by', 'aggregates', 'sort', 'limit')}
+    try:
+        dates = streaming.month_range(start_date, end_date)
+        query = store.build_query([police_api.format_date(date) for date in dates], filters,
+                                  [field for field in request.args.get('group_by', '').split(',') if field],
+                                  [name for name in request.args.get('aggregates', 'count').split(',') if name],
+                                  request.args.get('sort'), int(request.args.get('limit', 100)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    #Ingesting the months that are not in the store yet, then running the query on the stored records:
+    months, failed = ingest_range(dates)
+    rows = store.run_query(*query)
+    return jsonify({'months': months, 'failed': failed, 'rows': rows})
+
+
+@api.route('/api/distinct/<column>/<start_date>/<end_date>', methods = ['GET']) #"/api/distinct/<column>/<start_date>/<end_date>" Path calls the function
+@auth.login_required
+@rate_limited(ingest_cost)
+def get_distinct(column, start_date, end_date): #"get_distinct" counts the distinct "persistent_ids" or "person_ids" over a range of months.
+    
+    #Abort request if the column, the range of months or the mode is not valid:
+    mode = request.args.get('mode', 'auto')
+    if column not in store.DISTINCT_COLUMNS:
+        abort(404)
+    try:
+        dates = streaming.month_range(start_date, end_date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if mode not in ('auto', 'approx', 'exact'):
+        return jsonify({'error': 'The mode must be one of: auto, approx, exact'}), 400
+
+    months, failed = ingest_range(dates)
+    months = [month for month in months if month not in failed]
+
+    #Short ranges are counted exactly from the stored records, longer ones by merging the HyperLogLog registers:
+    if mode == 'exact' or (mode == 'auto' and len(months) <= current_app.config['EXACT_DISTINCT_MAX_MONTHS']):
+        return jsonify({'column': column, 'months': months, 'failed': failed, 'mode': 'exact',
+                        'distinct': store.exact_distinct(column, months)})
+    registers = store.merged_registers(column, months)
+    return jsonify({'column': column, 'months': months, 'failed': failed, 'mode': 'approx',
+                    'distinct': registers.count(), 'standard_error': registers.standard_error()})
+
+
+@api.route('/api/profiles/<secret_key>', methods = ['GET'])
+def list_profiles(secret_key): #"list_profiles" lists the profiled requests, newest first.
+    
+    #Secret key is a paramter just known to the admin:
+    if secret_key == current_app.config['SECRET_KEY']:
+        return jsonify(profiling.list_profiles())
+    
+    #Else return a suggestion:
+    else:
+        return "Your secret_key parameter is wrong"
+
+
+@api.route('/api/profiles/<profile_id>/<kind>/<secret_key>', methods = ['GET'])
+def get_profile(profile_id, kind, secret_key): #"get_profile" downloads the "prof", "txt" or "json" artifact of a profiled request.
+    
+    #Secret key is a paramter just known to the admin:
+    if secret_key == current_app.config['SECRET_KEY']:
+        path = profiling.profile_path(profile_id, kind)
+        if path is None or not os.path.exists(path):
+            abort(404)
+        return send_file(os.path.abspath(path), mimetype=profiling.PROFILE_KINDS[kind], as_attachment=True,
+                         attachment_filename=os.path.basename(path))
+    
+    #Else return a suggestion:
+    else:
+        return "Your secret_key parameter is wrong"
+
+
+@api.route('/metrics', methods = ['GET']) #"/metrics" Path calls the function
+def get_metrics(): #"get_metrics" exposes the metrics of this worker in the Prometheus text format.
+    return Response(metrics.render(current_app.config['METRICS_CACHE_FILES']), mimetype='text/plain; version=0.0.4')
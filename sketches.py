@@ -0,0 +1,128 @@
+#Importing required libraries:
+import hashlib
+import heapq
+import json
+import math
+
+
+#Amount of items kept by the heavy-hitters summary of a single month:
+SKETCH_CAPACITY = 256
+
+
+#Mergeable heavy-hitters summary (Space-Saving style) of the frequencies of a column.
+#
+#It keeps at most "capacity" items, each with an over-estimated "count" and the "error" of that estimate, plus a
+#"floor" that bounds the count of every item that is not listed. For every item:
+#    count - error <= true count <= count
+#and every unlisted item has a true count <= floor. Merging two summaries adds the counts (a missing item is
+#counted with the floor of the summary it is missing from) and the floors, so after merging the summaries of
+#several months the floor stays <= total / (capacity + 1) and any item with a true count above it is listed.
+class HeavyHitters(object):
+
+    def __init__(self, capacity=SKETCH_CAPACITY, counters=None, total=0, floor=0):
+        self.capacity = capacity
+        self.counters = counters if counters is not None else {}
+        self.total = total
+        self.floor = floor
+
+    #Building the summary of a month from the exact counts of its values (the summary starts with no error):
+    @classmethod
+    def from_counts(cls, counts, capacity=SKETCH_CAPACITY):
+        sketch = cls(capacity, {item: [count, 0] for item, count in counts.items()}, sum(counts.values()))
+        sketch._truncate()
+        return sketch
+
+    #Keeping only the "capacity" largest counts, the largest dropped count becomes part of the floor:
+    def _truncate(self):
+        if len(self.counters) <= self.capacity:
+            return
+        kept = heapq.nlargest(self.capacity + 1, self.counters.items(), key=lambda item: item[1][0])
+        self.floor = max(self.floor, kept[-1][1][0])
+        self.counters = dict(kept[:-1])
+
+    #Merging another summary into this one:
+    def merge(self, other):
+        counters = {}
+        for item in set(self.counters) | set(other.counters):
+            count, error = self.counters.get(item, (self.floor, self.floor))
+            other_count, other_error = other.counters.get(item, (other.floor, other.floor))
+            counters[item] = [count + other_count, error + other_error]
+        self.counters = counters
+        self.total += other.total
+        self.floor += other.floor
+        self._truncate()
+        return self
+
+    #Returning the "k" items with the largest counts as (item, count, error):
+    def top(self, k):
+        ranked = heapq.nlargest(k, self.counters.items(), key=lambda item: (item[1][0], -item[1][1]))
+        return [(item, count, error) for item, (count, error) in ranked]
+
+    #Serialising the summary to be persisted in the month store:
+    def dumps(self):
+        return json.dumps({"capacity": self.capacity, "total": self.total, "floor": self.floor,
+                           "counters": [[item, c[0], c[1]] for item, c in self.counters.items()]})
+
+    @classmethod
+    def loads(cls, payload):
+        data = json.loads(payload)
+        counters = {item: [count, error] for item, count, error in data["counters"]}
+        return cls(data["capacity"], counters, data["total"], data["floor"])
+
+
+#Precision of the HyperLogLog registers (2 ** 14 registers, a standard error of 1.04 / sqrt(2 ** 14) = 0.8%):
+HLL_PRECISION = 14
+
+
+#HyperLogLog register set estimating the amount of distinct values of a column.
+#
+#Registers of several months are merged by taking their element-wise maximum, which gives the registers of the
+#union of the months, so distinct counts over any range never need the raw values.
+class HyperLogLog(object):
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        import numpy as np #Imported on first use (see app.py)
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    #Adding a value: the first bits of its hash pick the register, the position of the first set bit of the rest is kept:
+    def add(self, value):
+        h = int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        import numpy as np
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    #Estimating the amount of distinct values (with the linear counting correction for small cardinalities):
+    def count(self):
+        import numpy as np
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / float(zeros))
+        return int(round(estimate))
+
+    #Relative standard error of the estimates:
+    def standard_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def dumps(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def loads(cls, payload, precision=HLL_PRECISION):
+        import numpy as np
+        return cls(precision, np.frombuffer(payload, dtype=np.uint8).copy())
@@ -0,0 +1,197 @@
+#Importing required libraries:
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+import store
+try:
+    import fcntl
+except ImportError: #Windows: concurrent imports at boot are not serialised
+    fcntl = None
+
+
+#Snapshots of the months cached by a node, so a new node starts warm instead of fetching every month again.
+#A snapshot is a gzipped tar holding "manifest.json" (first) and a consistent copy of each database, taken with the
+#SQLite backup API while the app keeps running:
+#    store.sqlite           the month store (records, sketches and registers of every ingested month)
+#    requests_cache.sqlite  the responses of the Police API cached by "requests_cache"
+#The manifest lists the sha256 of every file, which is checked before anything is imported.
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = 'manifest.json'
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+#Databases of a snapshot and their path on this node:
+def databases():
+    return {'store.sqlite': store.STORE_PATH,
+            'requests_cache.sqlite': current_app.config['REQUESTS_CACHE_NAME'] + '.sqlite'}
+
+
+#Copying a live database into another file (or another live database) with the SQLite backup API:
+def backup(source_path, target_path):
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(target_path, timeout=30)
+    try:
+        source.backup(target, pages=4096)
+    finally:
+        target.close()
+        source.close()
+
+
+#Counting the expiry of the imported responses of "requests_cache" from the import, instead of from when the exporting
+#node fetched them (otherwise the months of a snapshot older than REQUESTS_CACHE_EXPIRE_SECONDS are fetched again):
+def restamp_responses(path):
+    from requests_cache.backends.sqlite import SQLiteCache
+    cache = SQLiteCache(path)
+    try:
+        cache.reset_expiration(current_app.config['REQUESTS_CACHE_EXPIRE_SECONDS'])
+    finally:
+        cache.close()
+
+
+#Hashing a file (or a stream) with sha256:
+def sha256(f):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+#Writing a snapshot of the databases of this node to "path", returning its manifest:
+def export_snapshot(path):
+    workdir = tempfile.mkdtemp(prefix='snapshot-', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        files = {}
+        for name, source in databases().items():
+            if not os.path.exists(source):
+                continue
+            backup(source, os.path.join(workdir, name))
+            with open(os.path.join(workdir, name), 'rb') as f:
+                files[name] = {'sha256': sha256(f), 'bytes': os.path.getsize(f.name)}
+        if 'store.sqlite' not in files:
+            raise ValueError('There is no month store to export ({})'.format(store.STORE_PATH))
+
+        conn = sqlite3.connect(os.path.join(workdir, 'store.sqlite'))
+        try:
+            months = [month for (month,) in conn.execute('SELECT month FROM months ORDER BY month')]
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            conn.close()
+        manifest = {'format': SNAPSHOT_FORMAT, 'store_version': version, 'created_at': time.time(),
+                    'months': months, 'files': files}
+
+        #Writing the bundle next to its final path, then moving it there so a reader never sees a partial file:
+        partial = path + '.partial'
+        with tarfile.open(partial, 'w:gz') as tar:
+            payload = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+            info = tarfile.TarInfo(MANIFEST)
+            info.size, info.mtime = len(payload), int(manifest['created_at'])
+            tar.addfile(info, io.BytesIO(payload))
+            for name in files:
+                tar.add(os.path.join(workdir, name), arcname=name)
+        os.replace(partial, path)
+        return manifest
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+#Reading the manifest of a snapshot:
+def read_manifest(tar):
+    member = tar.next()
+    if member is None or member.name != MANIFEST:
+        raise ValueError('The snapshot does not start with {}'.format(MANIFEST))
+    manifest = json.loads(tar.extractfile(member).read().decode('utf-8'))
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError('Unsupported snapshot format {}'.format(manifest.get('format')))
+    if manifest.get('store_version') != store.STORE_VERSION:
+        raise ValueError('The snapshot holds version {} of the month store, this node uses version {}'.format(
+            manifest.get('store_version'), store.STORE_VERSION))
+    return manifest
+
+
+#Checking if the month store of this node holds any month:
+def store_is_empty():
+    if not os.path.exists(store.STORE_PATH):
+        return True
+    return store.connect().execute('SELECT 1 FROM months LIMIT 1').fetchone() is None
+
+
+#Importing a snapshot into the databases of this node, returning its manifest. The files are extracted and checked
+#against the manifest first, then copied into the databases with the backup API (safe while they are open).
+#Unless "force" is set, nothing is imported if the month store already holds months:
+def import_snapshot(path, force=False):
+    with open(store.STORE_PATH + '.snapshot-lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if not force and not store_is_empty():
+            return None
+
+        workdir = tempfile.mkdtemp(prefix='snapshot-', dir=os.path.dirname(os.path.abspath(store.STORE_PATH)))
+        try:
+            targets = databases()
+            with tarfile.open(path, 'r:gz') as tar:
+                manifest = read_manifest(tar)
+                for member in tar:
+                    if member.name == MANIFEST:
+                        continue
+                    if member.name not in manifest['files'] or member.name not in targets or not member.isfile():
+                        raise ValueError('Unexpected file {} in the snapshot'.format(member.name))
+                    target = os.path.join(workdir, member.name)
+                    with tar.extractfile(member) as source, open(target, 'wb') as f:
+                        shutil.copyfileobj(source, f, COPY_CHUNK_BYTES)
+                    with open(target, 'rb') as f:
+                        if sha256(f) != manifest['files'][member.name]['sha256']:
+                            raise ValueError('The checksum of {} does not match the manifest'.format(member.name))
+            missing = set(manifest['files']) - set(os.listdir(workdir))
+            if missing:
+                raise ValueError('The snapshot is missing {}'.format(', '.join(sorted(missing))))
+
+            for name in manifest['files']:
+                backup(os.path.join(workdir, name), targets[name])
+            if 'requests_cache.sqlite' in manifest['files']:
+                restamp_responses(targets['requests_cache.sqlite'])
+            store.new_generation()
+            return manifest
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+#Command writing a snapshot of the cached months:
+@click.command('export-snapshot')
+@click.argument('path', type=click.Path(dir_okay=False))
+@with_appcontext
+def export_snapshot_command(path):
+    started = time.perf_counter()
+    try:
+        manifest = export_snapshot(path)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo('{} months ({}) in {} ({:.1f} MB) in {:.1f}s'.format(
+        len(manifest['months']), ', '.join(sorted(manifest['files'])), path, os.path.getsize(path) / 1e6,
+        time.perf_counter() - started))
+
+
+#Command importing a snapshot (the running workers see the new generation of the store and empty their caches):
+@click.command('import-snapshot')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--force', is_flag=True, help='Replace the months already in the store (the running workers '
+              'empty their caches of the months within a second).')
+@with_appcontext
+def import_snapshot_command(path, force):
+    started = time.perf_counter()
+    try:
+        manifest = import_snapshot(path, force)
+    except (ValueError, tarfile.TarError) as e:
+        raise click.ClickException(str(e))
+    if manifest is None:
+        raise click.ClickException('The month store already holds months, use --force to replace them')
+    click.echo('{} months imported from {} in {:.1f}s'.format(len(manifest['months']), path, time.perf_counter() - started))
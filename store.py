@@ -0,0 +1,365 @@
+#Importing required libraries:
+import collections
+import itertools
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from flask import current_app, has_app_context
+import compact
+import crime_stats
+from sketches import HeavyHitters, HyperLogLog
+
+
+#Embedded database holding what has been ingested for every month (kept apart from the users in "db.sqlite"):
+STORE_PATH = 'crime_store.sqlite'
+
+#The columns summarised by a heavy-hitters sketch when a month is ingested:
+SKETCHED_COLUMNS = {
+    "streets": "street_names",
+    "locations": "location_subtypes",
+}
+
+#The id columns summarised by a HyperLogLog register set when a month is ingested:
+DISTINCT_COLUMNS = ["persistent_ids", "person_ids"]
+
+#Version of the schema below (months ingested by an older version are ingested again):
+STORE_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS months (
+    month TEXT PRIMARY KEY,
+    n_records INTEGER NOT NULL,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS month_sketches (
+    month TEXT NOT NULL,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (month, name)
+);
+CREATE TABLE IF NOT EXISTS month_registers (
+    month TEXT NOT NULL,
+    name TEXT NOT NULL,
+    registers BLOB NOT NULL,
+    PRIMARY KEY (month, name)
+);
+CREATE TABLE IF NOT EXISTS crime_facts (
+    month TEXT NOT NULL,
+    codes TEXT,
+    procedures TEXT,
+    dates TEXT,
+    person_ids INTEGER,
+    crime_categories TEXT,
+    location_types TEXT,
+    latitudes TEXT,
+    longitudes TEXT,
+    street_ids INTEGER,
+    street_names TEXT,
+    contexts TEXT,
+    persistent_ids TEXT,
+    crime_ids INTEGER,
+    location_subtypes TEXT,
+    months TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_crime_facts_month ON crime_facts (month);
+CREATE INDEX IF NOT EXISTS ix_crime_facts_category ON crime_facts (crime_categories, month);
+CREATE INDEX IF NOT EXISTS ix_crime_facts_outcome ON crime_facts (codes, month);
+CREATE INDEX IF NOT EXISTS ix_crime_facts_street ON crime_facts (street_ids, month);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+#Fields of the records returned by "query_facts" and their columns in "crime_facts":
+QUERY_FIELDS = {
+    "month": "month",
+    "category": "crime_categories",
+    "outcome": "codes",
+    "outcome_name": "procedures",
+    "date": "dates",
+    "person_id": "person_ids",
+    "location_type": "location_types",
+    "latitude": "latitudes",
+    "longitude": "longitudes",
+    "street_id": "street_ids",
+    "street": "street_names",
+    "context": "contexts",
+    "persistent_id": "persistent_ids",
+    "crime_id": "crime_ids",
+    "location_subtype": "location_subtypes",
+}
+
+#Fields the records can be filtered on ("category", "outcome" and "street_id" are indexed) and grouped by:
+FILTER_FIELDS = ["category", "outcome", "street_id", "location_type", "location_subtype"]
+GROUP_FIELDS = ["month", "category", "outcome", "outcome_name", "street_id", "street", "location_type", "location_subtype"]
+
+#Aggregates computed for each group: the amount of records, of distinct crimes and of distinct persons:
+AGGREGATES = {
+    "count": "COUNT(*)",
+    "crimes": "COUNT(DISTINCT NULLIF(persistent_ids, ''))",
+    "persons": "COUNT(DISTINCT person_ids)",
+}
+
+MAX_QUERY_LIMIT = 10000
+
+#Records read at a time when the columns of a month are read back from the store:
+FETCH_ROWS = 5000
+
+#Seconds between two checks of the generation of the store by a process:
+GENERATION_CHECK_SECONDS = 1.0
+
+#One connection per thread and the months this process already knows are ingested:
+_local = threading.local()
+_ingested = set()
+
+#Generation of the store last seen by this process, when it was checked and how many times this process has seen
+#the store replaced (see "check_generation"):
+_generation = {'value': None, 'checked': 0.0, 'replaced': 0}
+_generation_lock = threading.Lock()
+
+
+#Bytes of the store read through a memory map by each connection ("STORE_MMAP_MB" of the app, outside of an app the
+#store is read with system calls):
+def mmap_size():
+    return current_app.config['STORE_MMAP_MB'] * 2 ** 20 if has_app_context() else 0
+
+
+#Opening (once per thread) the connection to the month store:
+def connect():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != STORE_PATH:
+        conn = sqlite3.connect(STORE_PATH, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA mmap_size = {}'.format(mmap_size()))
+        conn.executescript(SCHEMA)
+        if conn.execute('PRAGMA user_version').fetchone()[0] < STORE_VERSION:
+            with conn:
+                conn.execute('DELETE FROM months')
+                conn.execute('DELETE FROM crime_facts')
+            conn.execute('PRAGMA user_version = {}'.format(STORE_VERSION))
+        _local.conn, _local.path = conn, STORE_PATH
+    return conn
+
+
+#Generation of the store, written again whenever a snapshot replaces its months:
+def generation():
+    row = connect().execute("SELECT value FROM store_meta WHERE key = 'generation'").fetchone()
+    return None if row is None else row[0]
+
+
+#Starting a new generation of the store (after a snapshot has replaced its months):
+def new_generation():
+    conn = connect()
+    conn.executescript(SCHEMA)
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('generation', ?)", (uuid.uuid4().hex,))
+    check_generation(force=True)
+
+
+#Checking (at most every GENERATION_CHECK_SECONDS) if another process has replaced the store, in which case the months
+#known to be ingested are forgotten. Returns how many times the store has been replaced, so the caches of the months
+#built on it (see "GenerationCache") are emptied when the count changes:
+def check_generation(force=False):
+    now = time.monotonic()
+    if force or now - _generation['checked'] >= GENERATION_CHECK_SECONDS:
+        with _generation_lock:
+            current = generation()
+            if current != _generation['value'] and _generation['checked'] > 0:
+                _ingested.clear()
+                _generation['replaced'] += 1
+            _generation['value'], _generation['checked'] = current, now
+    return _generation['replaced']
+
+
+#Memory cache of the values built on the months of the store (count series, columns, ...), as "key: (expires, value)".
+#The least recently stored values are dropped past "size" entries, and every value is forgotten when a snapshot
+#replaces the store:
+class GenerationCache(object):
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.replaced = 0
+        self.lock = threading.Lock()
+
+    #Value kept for a key, or "None" if there is none or it has expired:
+    def get(self, key):
+        replaced = check_generation()
+        with self.lock:
+            if replaced != self.replaced:
+                self.entries.clear()
+                self.replaced = replaced
+            entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    #Keeping a value for "expire" seconds:
+    def put(self, key, value, expire):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + expire, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    #Forgetting a key if it still holds "value":
+    def discard(self, key, value):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is value:
+                del self.entries[key]
+
+
+#Checking if a month (ex. "2018-11") has already been ingested:
+def is_ingested(month):
+    check_generation()
+    if month in _ingested:
+        return True
+    if connect().execute('SELECT 1 FROM months WHERE month = ?', (month,)).fetchone():
+        _ingested.add(month)
+        return True
+    return False
+
+
+#Ids that are missing from a record are not counted as distinct values:
+def _present(values):
+    return [value for value in values if value is not None and value != ""]
+
+
+#Ingesting a month while its records are downloaded: the sketches are updated with every batch of flattened records
+#and, once the month is complete, its records, metadata and sketches are written in one transaction:
+class MonthIngest(object):
+
+    def __init__(self, month):
+        self.month = month
+        self.tallies = {name: Counter() for name in SKETCHED_COLUMNS}
+        self.registers = {column: HyperLogLog() for column in DISTINCT_COLUMNS}
+
+    #Adding a batch of flattened records to the sketches:
+    def add(self, columns):
+        for name, column in SKETCHED_COLUMNS.items():
+            self.tallies[name].update(columns[column])
+        for column in DISTINCT_COLUMNS:
+            self.registers[column].update(_present(columns[column]))
+        return self
+
+    #Writing the complete month (all of its batches) to the store:
+    def finish(self, columns):
+        month = self.month
+        n_records = len(columns["codes"])
+        sketches = [(month, name, HeavyHitters.from_counts(counts).dumps()) for name, counts in self.tallies.items()]
+        registers = [(month, column, sqlite3.Binary(hll.dumps())) for column, hll in self.registers.items()]
+        facts = zip(itertools.repeat(month), *[columns[column] for column in crime_stats.RECORD_COLUMNS])
+        conn = connect()
+        with conn:
+            conn.execute('DELETE FROM crime_facts WHERE month = ?', (month,))
+            conn.executemany('INSERT INTO crime_facts (month, {}) VALUES (?, {})'.format(
+                ', '.join(crime_stats.RECORD_COLUMNS), ', '.join('?' * len(crime_stats.RECORD_COLUMNS))), facts)
+            conn.execute('INSERT OR REPLACE INTO months (month, n_records, ingested_at) VALUES (?, ?, ?)',
+                         (month, n_records, time.time()))
+            conn.executemany('INSERT OR REPLACE INTO month_sketches (month, name, payload) VALUES (?, ?, ?)', sketches)
+            conn.executemany('INSERT OR REPLACE INTO month_registers (month, name, registers) VALUES (?, ?, ?)', registers)
+        _ingested.add(month)
+
+
+#Amount of records of an ingested month, or "None" if the month has not been ingested:
+def month_records(month):
+    row = connect().execute('SELECT n_records FROM months WHERE month = ?', (month,)).fetchone()
+    return None if row is None else row[0]
+
+
+#Columns of an ingested month read back from its records (in the order they were received), with the time it was
+#ingested, or "None" if the month has not been ingested:
+def month_columns(month):
+    check_generation()
+    conn = connect()
+    row = conn.execute('SELECT ingested_at FROM months WHERE month = ?', (month,)).fetchone()
+    if row is None:
+        return None
+    cursor = conn.execute('SELECT {} FROM crime_facts WHERE month = ? ORDER BY rowid'.format(
+        ', '.join(crime_stats.RECORD_COLUMNS)), (month,))
+    columns = compact.CompactMonth()
+    rows = cursor.fetchmany(FETCH_ROWS)
+    while rows:
+        columns.extend(dict(zip(crime_stats.RECORD_COLUMNS, map(list, zip(*rows)))))
+        rows = cursor.fetchmany(FETCH_ROWS)
+    return columns.seal(), row[0]
+
+
+#Merging the heavy-hitters sketches of a column over several months (in time proportional to the months):
+def merged_sketch(name, months):
+    merged = HeavyHitters()
+    query = 'SELECT payload FROM month_sketches WHERE name = ? AND month IN ({})'.format(','.join('?' * len(months)))
+    for (payload,) in connect().execute(query, [name] + list(months)):
+        merged.merge(HeavyHitters.loads(payload))
+    return merged
+
+
+#Merging the HyperLogLog registers of an id column over several months:
+def merged_registers(column, months):
+    merged = HyperLogLog()
+    query = 'SELECT registers FROM month_registers WHERE name = ? AND month IN ({})'.format(','.join('?' * len(months)))
+    for (registers,) in connect().execute(query, [column] + list(months)):
+        merged.merge(HyperLogLog.loads(registers))
+    return merged
+
+
+#Counting the exact amount of distinct values of an id column over several months from the stored records:
+def exact_distinct(column, months):
+    if column not in DISTINCT_COLUMNS:
+        raise ValueError('Unknown column {}'.format(column))
+    query = "SELECT COUNT(DISTINCT {0}) FROM crime_facts WHERE month IN ({1}) AND {0} IS NOT NULL AND {0} != ''".format(
+        column, ','.join('?' * len(months)))
+    return connect().execute(query, list(months)).fetchone()[0]
+
+
+#Building the query of the stored records of several months, raising ValueError if a parameter is not valid.
+#"filters" maps a field to the values it may take; with "group_by" the records are grouped and the "aggregates" of
+#each group are returned, otherwise the records themselves. "sort" is a returned field or aggregate ("-" first sorts
+#in descending order). Returns the SQL, its parameters and the names of the returned fields:
+def build_query(months, filters=None, group_by=(), aggregates=("count",), sort=None, limit=100):
+    where, params = ['month IN ({})'.format(','.join('?' * len(months)))], list(months)
+    for field, values in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise ValueError('Unknown filter {}, the filters are: {}'.format(field, ', '.join(FILTER_FIELDS)))
+        if field == "street_id":
+            try:
+                values = [int(value) for value in values]
+            except ValueError:
+                raise ValueError('The street_id filter must be an integer')
+        where.append('{} IN ({})'.format(QUERY_FIELDS[field], ','.join('?' * len(values))))
+        params.extend(values)
+    if not 1 <= limit <= MAX_QUERY_LIMIT:
+        raise ValueError('The limit must be between 1 and {}'.format(MAX_QUERY_LIMIT))
+
+    if group_by:
+        for field in group_by:
+            if field not in GROUP_FIELDS:
+                raise ValueError('Unknown group_by field {}, the fields are: {}'.format(field, ', '.join(GROUP_FIELDS)))
+        for name in aggregates:
+            if name not in AGGREGATES:
+                raise ValueError('Unknown aggregate {}, the aggregates are: {}'.format(name, ', '.join(AGGREGATES)))
+        names = list(group_by) + list(aggregates)
+        selected = [QUERY_FIELDS[field] for field in group_by] + [AGGREGATES[name] for name in aggregates]
+        grouping = ' GROUP BY ' + ', '.join(QUERY_FIELDS[field] for field in group_by)
+        sort = sort or ('-' + aggregates[0] if aggregates else group_by[0])
+    else:
+        names = list(QUERY_FIELDS)
+        selected = [QUERY_FIELDS[field] for field in names]
+        grouping = ''
+        sort = sort or 'month'
+
+    descending = sort.startswith('-')
+    if sort.lstrip('-') not in names:
+        raise ValueError('Unknown sort {}, the results can be sorted by: {}'.format(sort.lstrip('-'), ', '.join(names)))
+    query = 'SELECT {} FROM crime_facts WHERE {}{} ORDER BY {} {} LIMIT ?'.format(
+        ', '.join(selected), ' AND '.join(where), grouping, names.index(sort.lstrip('-')) + 1, 'DESC' if descending else 'ASC')
+    return query, params + [limit], names
+
+
+#Running a query built by "build_query" (the filtering, grouping and sorting are all done by SQLite):
+def run_query(query, params, names):
+    return [dict(zip(names, row)) for row in connect().execute(query, params)]
@@ -0,0 +1,135 @@
+#Importing required libraries:
+import json
+import time
+from collections import Counter
+import batch
+import circuit
+import crime_stats
+import metrics
+import police_api
+
+
+#Maximum amount of months of a range (streamed, ranked, counted or queried) and amount of months fetched ahead of the
+#one being aggregated by a stream:
+MAX_RANGE_MONTHS = 120
+PREFETCH_MONTHS = 2
+
+#Endpoints that can be streamed month by month:
+STREAM_ENDPOINTS = ["all_crime_data"] + sorted(crime_stats.COUNTS)
+
+
+#Listing every month between two dates given as "YYYYMM" (both included):
+def month_range(start_date, end_date):
+    try:
+        year, month = int(str(start_date)[0:4]), int(str(start_date)[4:])
+        end_year, end_month = int(str(end_date)[0:4]), int(str(end_date)[4:])
+    except ValueError:
+        raise ValueError('The dates must be given as YYYYMM')
+    if not (1 <= month <= 12 and 1 <= end_month <= 12) or (year, month) > (end_year, end_month):
+        raise ValueError('The dates must be given as YYYYMM and the start date cannot be after the end date')
+    dates = []
+    while (year, month) <= (end_year, end_month):
+        dates.append('{:04d}{:02d}'.format(year, month))
+        month += 1
+        if month == 13:
+            year, month = year + 1, 1
+    if len(dates) > MAX_RANGE_MONTHS:
+        raise ValueError('A range covers at most {} months'.format(MAX_RANGE_MONTHS))
+    return dates
+
+
+#Formatting a Server-Sent Event:
+def sse_event(event, data):
+    return 'event: {}\ndata: {}\n\n'.format(event, json.dumps(data, separators=(",", ":")))
+
+
+#State of a multi-month job: it turns every month that is ready into "month", "total" and "progress" events.
+#The headers of a stream are sent before its months are loaded, so every event carries a "stale" field instead: if its
+#month was served from the store while the Police API was unhealthy, or the months served so far from the store:
+class StreamJob(object):
+
+    def __init__(self, endpoint, dates):
+        self.endpoint = endpoint
+        self.dates = dates
+        self.done = 0
+        self.aggregated = 0
+        self.started = time.monotonic()
+        self.counts = Counter()
+        self.n_records = 0
+        self.stale = []
+
+    #Event sent before the first month is fetched:
+    def start(self):
+        return [sse_event("start", {"endpoint": self.endpoint, "months": [police_api.format_date(d) for d in self.dates],
+                                    "stale": self.stale})]
+
+    #Progress of the job with an estimate of the remaining seconds:
+    def progress(self, date, stale=False):
+        self.done += 1
+        elapsed = time.monotonic() - self.started
+        eta = elapsed / self.done * (len(self.dates) - self.done)
+        return sse_event("progress", {"month": police_api.format_date(date), "done": self.done, "total": len(self.dates),
+                                      "elapsed": round(elapsed, 3), "eta": round(eta, 3), "stale": stale})
+
+    #Partial result of one month and the running total of every month so far:
+    @metrics.timed('pandas')
+    def month(self, date, columns, stale=False):
+        my_date = police_api.format_date(date)
+        self.aggregated += 1
+        if stale:
+            self.stale.append(my_date)
+        if self.endpoint == "all_crime_data":
+            frame = crime_stats.records_frame(columns)
+            frame = frame.astype(object).where(frame.notna(), None)
+            self.n_records += len(frame)
+            events = [sse_event("month", {"month": my_date, "result": list(frame.to_dict(orient = "index").items()), "stale": stale}),
+                      sse_event("total", {"months": self.aggregated, "n_records": self.n_records, "stale": self.stale})]
+        else:
+            column, label = crime_stats.COUNTS[self.endpoint]
+            series = crime_stats.count_series(columns, column)
+            self.counts.update(dict(zip(series.values, series.counts)))
+            events = [sse_event("month", {"month": my_date, "result": series.table(label), "stale": stale}),
+                      sse_event("total", {"months": self.aggregated, "result": crime_stats.CountSeries(self.counts).table(label),
+                                          "stale": self.stale})]
+        return events + [self.progress(date, stale)]
+
+    #Error of one month (the job carries on with the next months):
+    def failed(self, date, error):
+        return [sse_event("error", {"month": police_api.format_date(date), "status": error.status_code, "stale": False}),
+                self.progress(date)]
+
+    #Event sent once every month has been streamed:
+    def finish(self):
+        return [sse_event("done", {"months": self.done, "elapsed": round(time.monotonic() - self.started, 3),
+                                   "stale": self.stale})]
+
+
+#Checking if a month of the current request was served from the store (see "circuit.stale_columns"):
+def is_stale(date):
+    return police_api.format_date(date) in (circuit.stale_months.get() or {})
+
+
+#Streaming a job with the blocking client, fetching the next months while the current one is aggregated:
+def stream_job(endpoint, dates, load_columns):
+    job = StreamJob(endpoint, dates)
+    pending = [batch.submit(batch.resolve, load_columns, date) for date in dates[:PREFETCH_MONTHS]]
+    try:
+        for event in job.start():
+            yield event
+        for i, date in enumerate(dates):
+            columns = pending.pop(0).result()
+            if i + PREFETCH_MONTHS < len(dates):
+                pending.append(batch.submit(batch.resolve, load_columns, dates[i + PREFETCH_MONTHS]))
+            if isinstance(columns, police_api.UpstreamError):
+                events = job.failed(date, columns)
+            else:
+                events = job.month(date, columns, is_stale(date))
+            for event in events:
+                yield event
+        for event in job.finish():
+            yield event
+
+    #Cancelling the months that have not been fetched yet when the client goes away:
+    finally:
+        for future in pending:
+            future.cancel()
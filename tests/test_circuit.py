@@ -0,0 +1,95 @@
+#Tests of the transitions of the circuit breaker of the Police API ("circuit.CircuitBreaker"):
+import pytest
+import circuit
+from circuit import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+
+
+#Clock of the breaker, moved forward by the tests:
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_closed_until_the_failure_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(False)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_a_success_resets_the_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+
+def test_calls_answered_by_the_cache_do_not_count(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record(None)
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_open_fails_fast_until_the_reset(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record(False)
+    clock[0] += 10
+    assert not breaker.allow()
+    assert breaker.retry_after() == 20
+    clock[0] += 20
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_lets_the_probes_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30, half_open_probes=2)
+    breaker.record(False)
+    clock[0] += 30
+    assert breaker.allow()
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert breaker.retry_after() == 1
+
+
+def test_a_successful_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record(False)
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED and breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_a_failed_probe_opens_the_circuit_again(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        breaker.record(False)
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+
+def test_a_probe_answered_by_the_cache_is_given_back(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record(False)
+    clock[0] += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(None)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
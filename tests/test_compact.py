@@ -0,0 +1,98 @@
+#Tests of the compact in-memory form of a month ("compact.CompactMonth") against the lists of "flatten_records":
+#    python -m pytest -q tests
+import pytest
+import crime_stats
+from benchmarks.synthetic import generate_records
+from compact import CompactMonth, CoordinateColumn, EncodedColumn, IntegerColumn
+
+
+#Reading every column of a compact month back as lists:
+def as_lists(month):
+    return {name: list(month[name]) for name in crime_stats.RECORD_COLUMNS}
+
+
+#Building a compact month from the flattened columns, appended in batches of "batch_size" records:
+def compact_month(columns, batch_size=None):
+    if batch_size is None:
+        return CompactMonth.from_columns(columns)
+    month = CompactMonth()
+    for start in range(0, len(columns["codes"]), batch_size):
+        month.extend({name: values[start:start + batch_size] for name, values in columns.items()})
+    return month.seal()
+
+
+@pytest.mark.parametrize("batch_size", [None, 1, 7, 500])
+def test_round_trip(batch_size):
+    columns = crime_stats.flatten_records(generate_records(1000, "2018-11", seed=2, n_streets=50))
+    month = compact_month(columns, batch_size)
+    assert month.n_records() == 1000
+    assert as_lists(month) == columns
+    for name, values in columns.items():
+        assert month[name][3] == values[3]
+        assert month[name][-1] == values[-1]
+        assert month[name][10:20] == values[10:20]
+
+
+def test_coordinates_that_are_not_exact_decimals():
+    records = generate_records(8, "2018-11", seed=3, n_streets=4)
+    latitudes = ["51.50986500000000001", "1e-3", " 51.5", "51.", "-0.0", "51", None, ""]
+    for record, latitude in zip(records, latitudes):
+        record["crime"]["location"]["latitude"] = latitude
+    columns = crime_stats.flatten_records(records)
+    month = CompactMonth.from_columns(columns)
+    assert isinstance(month["latitudes"], CoordinateColumn)
+    assert sorted(month["latitudes"].others) == [0, 1, 2, 3, 6, 7]
+    assert list(month["latitudes"]) == latitudes
+    assert [month["latitudes"][i] for i in range(-8, 8)] == latitudes + latitudes
+    assert as_lists(month) == columns
+
+
+def test_missing_integers_use_the_sentinel():
+    column = IntegerColumn()
+    column.extend([1, None, 3])
+    column.extend([None, 5])
+    assert column.missing == 2
+    assert column.numbers[1] == IntegerColumn.MISSING
+    assert list(column) == [1, None, 3, None, 5]
+    assert column[1] == column[-2] is None
+    assert column[:3] == [1, None, 3]
+
+
+@pytest.mark.parametrize("value", ["1234", 2 ** 64, 1.5])
+def test_integer_column_falls_back_to_a_list(value):
+    records = generate_records(6, "2018-11", seed=4, n_streets=4)
+    records[1]["person_id"] = None
+    columns = crime_stats.flatten_records(records)
+    month = compact_month(columns, batch_size=3)
+    more = crime_stats.flatten_records(generate_records(2, "2018-12", seed=5, n_streets=4))
+    more["street_ids"][1] = value
+    month.extend(more)
+    assert isinstance(month["street_ids"], list)
+    assert isinstance(month["person_ids"], IntegerColumn)
+    assert month["street_ids"] == columns["street_ids"] + more["street_ids"]
+    assert as_lists(month) == {name: columns[name] + more[name] for name in columns}
+
+
+def test_encoded_column_is_promoted_past_65535_values():
+    column = EncodedColumn()
+    first = ["id {}".format(i) for i in range(60000)]
+    second = ["id {}".format(i) for i in range(50000, 70000)] + [None, "id 0"]
+    column.extend(first)
+    assert column.codes.typecode == "H"
+    column.seal()
+    column.extend(second)
+    assert column.codes.typecode == "I"
+    assert len(column.values) == 70001
+    assert list(column) == first + second
+    assert column[-1] == "id 0" and column[-2] is None
+    assert column.counts()["id 55000"] == 2
+
+
+def test_promoted_column_in_a_month():
+    columns = crime_stats.flatten_records(generate_records(3, "2018-11", seed=6, n_streets=4))
+    columns = {name: values * 24000 for name, values in columns.items()}
+    columns["persistent_ids"] = ["{:064x}".format(i) for i in range(72000)]
+    month = CompactMonth.from_columns(columns)
+    assert month["persistent_ids"].codes.typecode == "I"
+    assert month["codes"].codes.typecode == "H"
+    assert as_lists(month) == columns
@@ -0,0 +1,24 @@
+#Tests of the ranges of months accepted by the stream, top, distinct and query endpoints ("streaming.month_range"):
+import pytest
+import streaming
+
+
+def test_range_across_years():
+    assert streaming.month_range("201811", "201902") == ["201811", "201812", "201901", "201902"]
+
+
+def test_single_month():
+    assert streaming.month_range("201811", "201811") == ["201811"]
+
+
+@pytest.mark.parametrize("start_date, end_date", [("2018", "201811"), ("201813", "201901"), ("201812", "201811"),
+                                                  ("abcdef", "201811")])
+def test_invalid_dates(start_date, end_date):
+    with pytest.raises(ValueError, match="YYYYMM"):
+        streaming.month_range(start_date, end_date)
+
+
+def test_longest_range():
+    assert len(streaming.month_range("200901", "201812")) == streaming.MAX_RANGE_MONTHS
+    with pytest.raises(ValueError, match="A range covers at most 120 months"):
+        streaming.month_range("200812", "201812")
@@ -0,0 +1,97 @@
+#Tests of the incremental parser of the responses of the Police API ("police_api.RecordParser"):
+#    python -m pytest -q tests
+import json
+import pytest
+import crime_stats
+from benchmarks.synthetic import generate_records
+from police_api import RecordParser
+
+
+#A few records, two of them holding characters encoded on 2, 3 and 4 bytes in UTF-8:
+def sample_records():
+    records = generate_records(6, "2018-11", seed=1, n_streets=4)
+    records[1]["crime"]["location"]["street"]["name"] = "On or near Rue de l'Église"
+    records[4]["crime"]["location"]["street"]["name"] = "On or near € Street \U0001D11E"
+    return records
+
+
+def sample_body(records, **kwargs):
+    return json.dumps(records, ensure_ascii=False, **kwargs).encode("utf-8")
+
+
+#Feeding the chunks of a body and merging the flattened batches returned:
+def parse(chunks, batch_size=4):
+    parser = RecordParser(batch_size)
+    batches = []
+    for chunk in chunks:
+        batches.extend(parser.feed(chunk))
+    batches.extend(parser.close())
+    columns = crime_stats.empty_columns()
+    for batch in batches:
+        assert len(batch["codes"]) <= batch_size
+        for name in columns:
+            columns[name].extend(batch[name])
+    return columns
+
+
+def test_body_in_one_chunk():
+    records = sample_records()
+    assert parse([sample_body(records)]) == crime_stats.flatten_records(records)
+
+
+def test_body_split_at_every_byte():
+    records = sample_records()
+    body = sample_body(records, indent=1)
+    expected = crime_stats.flatten_records(records)
+    for split in range(len(body) + 1):
+        assert parse([body[:split], body[split:]]) == expected, split
+
+
+def test_body_fed_one_byte_at_a_time():
+    records = sample_records()
+    body = sample_body(records)
+    assert parse([body[i:i + 1] for i in range(len(body))], batch_size=1) == crime_stats.flatten_records(records)
+
+
+def test_multibyte_characters_split_across_chunks():
+    records = sample_records()
+    body = sample_body(records)
+    for character in ["É", "€", "\U0001D11E"]:
+        start = body.index(character.encode("utf-8"))
+        for offset in range(1, len(character.encode("utf-8"))):
+            columns = parse([body[:start + offset], body[start + offset:]])
+            assert columns["street_names"] == [record["crime"]["location"]["street"]["name"] for record in records]
+
+
+def test_numbers_split_across_chunks():
+    body = b'[{"a": 1}, 12345, 6.5e3]'
+    parser = RecordParser()
+    for i in range(len(body)):
+        parser._parse(body[i:i + 1], False)
+    parser._parse(b'', True)
+    assert parser._records == [{"a": 1}, 12345, 6.5e3]
+
+
+def test_empty_list():
+    assert parse([b' [ ] ']) == crime_stats.empty_columns()
+
+
+@pytest.mark.parametrize("cut", [1, 2, 40, -2, -1])
+def test_truncated_body_raises(cut):
+    body = sample_body(sample_records())
+    with pytest.raises(ValueError):
+        parse([body[:cut]])
+
+
+def test_body_cut_inside_a_multibyte_character_raises():
+    body = sample_body(sample_records())
+    end = body.index("\U0001D11E".encode("utf-8")) + 2
+    with pytest.raises(ValueError):
+        parse([body[:end]])
+
+
+@pytest.mark.parametrize("body", [b'', b'{"records": []}', b'[{"a": 1}] [', b'[{"a": 1},, }]', b'[{"a": tru}]',
+                                  b'\xff[]'])
+def test_malformed_body_raises(body):
+    with pytest.raises(ValueError):
+        parse([body])
@@ -0,0 +1,79 @@
+#Tests of the heavy-hitters summaries merged over a range of months ("sketches.HeavyHitters"):
+import random
+from collections import Counter
+from sketches import HeavyHitters
+
+
+#Skewed counts of a month (a few items hold most of the records, like the streets of the Police API):
+def month_counts(seed, n_records=5000, n_items=300):
+    rng = random.Random(seed)
+    items = ["street {}".format(i) for i in range(n_items)]
+    weights = [1.0 / (i + 1) for i in range(n_items)]
+    rng.shuffle(weights)
+    return Counter(rng.choices(items, weights, k=n_records))
+
+
+#Checking the guarantees of a summary against the exact counts:
+def check_bounds(sketch, counts):
+    assert sketch.total == sum(counts.values())
+    assert len(sketch.counters) <= sketch.capacity
+    assert sketch.floor <= sketch.total / (sketch.capacity + 1.0)
+    for item, true_count in counts.items():
+        if item in sketch.counters:
+            count, error = sketch.counters[item]
+            assert count - error <= true_count <= count, item
+        else:
+            assert true_count <= sketch.floor, item
+
+
+def test_month_under_capacity_is_exact():
+    counts = Counter({"a": 5, "b": 3, "c": 1})
+    sketch = HeavyHitters.from_counts(counts, capacity=8)
+    assert sketch.floor == 0
+    assert sketch.top(2) == [("a", 5, 0), ("b", 3, 0)]
+
+
+def test_month_over_capacity_keeps_the_largest_counts():
+    counts = month_counts(1)
+    sketch = HeavyHitters.from_counts(counts, capacity=16)
+    check_bounds(sketch, counts)
+    assert sorted(c for c, _ in sketch.counters.values()) == sorted(counts.values())[-16:]
+    assert sketch.floor == sorted(counts.values())[-17]
+    assert all(error == 0 for _, error in sketch.counters.values())
+
+
+def test_merged_months_keep_the_error_bounds():
+    for capacity in (4, 16, 64):
+        merged, total = HeavyHitters(capacity), Counter()
+        for month in range(24):
+            counts = month_counts(month)
+            merged.merge(HeavyHitters.from_counts(counts, capacity))
+            total.update(counts)
+            check_bounds(merged, total)
+
+
+def test_merge_lists_every_item_above_the_floor():
+    merged, total = HeavyHitters(32), Counter()
+    for month in range(12):
+        counts = month_counts(100 + month)
+        merged.merge(HeavyHitters.from_counts(counts, 32))
+        total.update(counts)
+    assert [item for item, count in total.items() if count > merged.floor]
+    assert all(item in merged.counters for item, count in total.items() if count > merged.floor)
+
+
+def test_merge_of_disjoint_months():
+    first = HeavyHitters.from_counts(Counter({"a": 10, "b": 1}), capacity=1)
+    second = HeavyHitters.from_counts(Counter({"c": 7, "d": 2}), capacity=1)
+    merged = HeavyHitters(1).merge(first).merge(second)
+    assert merged.total == 20
+    assert merged.floor == 8 #"c" is counted 1 + 7 after the merge, then dropped
+    assert merged.top(1) == [("a", 12, 2)]
+    check_bounds(merged, Counter({"a": 10, "b": 1, "c": 7, "d": 2}))
+
+
+def test_dumps_and_loads():
+    sketch = HeavyHitters.from_counts(month_counts(7), capacity=16)
+    loaded = HeavyHitters.loads(sketch.dumps())
+    assert (loaded.capacity, loaded.total, loaded.floor, loaded.counters) == \
+        (sketch.capacity, sketch.total, sketch.floor, sketch.counters)